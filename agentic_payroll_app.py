@@ -1,12 +1,18 @@
 import os
+import functools
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+import shutil
 import tempfile
 import json
+import orjson
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from pathlib import Path
 from typing import Dict, Any, List
 import logging
 
@@ -15,19 +21,11 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Local imports
-from payroll_workflow import PayrollAgenticWorkflow, create_payroll_workflow
+from payroll_workflow import PayrollAgenticWorkflow, create_payroll_workflow, TASK_STARTED, TASK_COMPLETED
 from models import ProcessingResult
 
-# Set page config
-st.set_page_config(
-    page_title="AgenticAI Payroll System",
-    page_icon="🤖",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
-
-# Custom CSS
-st.markdown("""
+# Page constants (built once at import, not on every rerun)
+CUSTOM_CSS = """
 <style>
     .main-header {
         font-size: 2.5rem;
@@ -58,16 +56,109 @@ st.markdown("""
         box-shadow: 0 2px 4px rgba(0,0,0,0.1);
         text-align: center;
     }
+    .metric-card .metric-label {
+        font-size: 0.875rem;
+        color: #555;
+    }
+    .metric-card .metric-value {
+        font-size: 2rem;
+        font-weight: 600;
+    }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+AGENT_INFO = (
+    {
+        "name": "Contract Reader Agent",
+        "description": "Extracts and parses employee contract data from PDF documents",
+        "icon": "📄",
+        "status": "ready"
+    },
+    {
+        "name": "Salary Breakdown Agent", 
+        "description": "Calculates comprehensive salary breakdown with all deductions",
+        "icon": "💰",
+        "status": "ready"
+    },
+    {
+        "name": "Compliance Mapper Agent",
+        "description": "RAG-enabled validation against latest government rules",
+        "icon": "⚖️",
+        "status": "ready"
+    },
+    {
+        "name": "Anomaly Detector Agent",
+        "description": "Detects calculation errors and data inconsistencies",
+        "icon": "🔍",
+        "status": "ready"
+    },
+    {
+        "name": "Paystub Generator Agent",
+        "description": "Generates professional paystubs and tax documents",
+        "icon": "📋",
+        "status": "ready"
+    }
+)
+
+# Chart config for static breakdown figures: skip the mode bar
+PLOTLY_STATIC_CONFIG = {"staticPlot": False, "displayModeBar": False}
+
+COMPLIANCE_STATUS_FN = {
+    "COMPLIANT": st.success,
+    "NON_COMPLIANT": st.error,
+    "REVIEW_REQUIRED": st.warning
+}
+
+COMPLIANCE_STATUS_ICON = {
+    "COMPLIANT": "✅",
+    "NON_COMPLIANT": "❌",
+    "REVIEW_REQUIRED": "⚠️"
+}
+
+ANOMALY_STATUS_FN = {
+    "NORMAL": st.success,
+    "REVIEW_REQUIRED": st.warning,
+    "CRITICAL": st.error
+}
+
+ANOMALY_STATUS_ICON = {
+    "NORMAL": "✅",
+    "REVIEW_REQUIRED": "⚠️",
+    "CRITICAL": "🚨"
+}
+
+SALARY_ANALYTICS_COLUMNS = ["Employee", "Gross Salary", "Net Salary", "Total Deductions"]
+
+RESULT_SECTIONS = ("📄 Contract Data", "💰 Salary Breakdown", "⚖️ Compliance", "🔍 Anomalies", "📋 Documents")
+
+# Paystub fields included in the JSON export
+EXPORT_FIELDS = {"employee_info", "salary_breakdown", "compliance_info", "pay_period", "generated_date"}
+
+MENU_OPTIONS = {
+    "🏠 Dashboard": "dashboard",
+    "📤 Process Contract": "process",
+    "📊 Analytics": "analytics"
+}
+
+# Set page config
+st.set_page_config(
+    page_title="AgenticAI Payroll System",
+    page_icon="🤖",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+
+# Custom CSS
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 # Initialize session state
-if 'workflow' not in st.session_state:
-    st.session_state.workflow = None
-if 'processing_results' not in st.session_state:
-    st.session_state.processing_results = []
-if 'current_result' not in st.session_state:
-    st.session_state.current_result = None
+for key, default in (("workflow", None), ("processing_results", []), ("current_result", None)):
+    st.session_state.setdefault(key, default)
+
+@st.cache_resource(show_spinner=False)
+def _get_workflow(api_key: str) -> PayrollAgenticWorkflow:
+    """Create the payroll workflow once per API key and share it across sessions"""
+    return create_payroll_workflow(api_key)
 
 def initialize_workflow():
     """Initialize the payroll workflow"""
@@ -79,13 +170,24 @@ def initialize_workflow():
         
         if st.session_state.workflow is None:
             with st.spinner("Initializing AgenticAI Payroll System..."):
-                st.session_state.workflow = create_payroll_workflow(api_key)
+                st.session_state.workflow = _get_workflow(api_key)
         
         return st.session_state.workflow
     except Exception as e:
         st.error(f"Failed to initialize workflow: {e}")
         return None
 
+def _set_page(page: str):
+    """Switch the active page; Streamlit reruns once after the callback"""
+    st.session_state.page = page
+
+def _open_recent_result(recent: List[ProcessingResult]):
+    """Show the result picked in the sidebar's recent processes list"""
+    selected = st.session_state.recent_process
+    if selected is not None and selected < len(recent):
+        st.session_state.current_result = recent[selected]
+        st.session_state.page = "result_detail"
+
 def sidebar_config():
     """Configure the sidebar with settings and controls"""
     st.sidebar.title("🔧 Configuration")
@@ -120,97 +222,79 @@ def sidebar_config():
     st.sidebar.subheader("🚀 Quick Actions")
     
     if st.sidebar.button("🔄 Reset System"):
+        _get_workflow.clear()
         st.session_state.workflow = None
         st.session_state.processing_results = []
         st.session_state.current_result = None
         st.rerun()
     
-    if st.sidebar.button("📊 View Analytics"):
-        st.session_state.page = "analytics"
-        st.rerun()
+    st.sidebar.button("📊 View Analytics", on_click=_set_page, args=("analytics",))
     
     # Recent Processing History
     st.sidebar.subheader("📋 Recent Processes")
     
     if st.session_state.processing_results:
-        for i, result in enumerate(st.session_state.processing_results[-5:]):
+        recent = st.session_state.processing_results[-5:]
+        
+        def format_recent(i: int) -> str:
+            result = recent[i]
             status_icon = "✅" if result.success else "❌"
             employee_id = result.employee_id if result.employee_id != "unknown" else f"Process {i+1}"
-            
-            if st.sidebar.button(f"{status_icon} {employee_id}", key=f"recent_{i}"):
-                st.session_state.current_result = result
-                st.session_state.page = "result_detail"
-                st.rerun()
+            return f"{status_icon} {employee_id}"
+        
+        st.sidebar.radio(
+            "Recent Processes",
+            range(len(recent)),
+            format_func=format_recent,
+            index=None,
+            key="recent_process",
+            on_change=_open_recent_result,
+            args=(recent,),
+            label_visibility="collapsed"
+        )
+
+def render_metric_card(label: str, value: Any):
+    """Render a dashboard metric card with a single markdown call"""
+    st.markdown(
+        f'<div class="metric-card"><div class="metric-label">{label}</div><div class="metric-value">{value}</div></div>',
+        unsafe_allow_html=True
+    )
 
 def main_dashboard():
     """Main dashboard page"""
     st.markdown('<h1 class="main-header">🤖 AgenticAI Payroll Processing System</h1>', unsafe_allow_html=True)
     
     # System overview
+    results = st.session_state.processing_results
+    total = len(results)
+    if total:
+        df_results = _results_frame(_results_key(results), results)
+        successful = int(df_results["success"].sum())
+        avg_time = df_results["processing_time"].mean()
+    else:
+        successful = 0
+        avg_time = 0.0
+    
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-        st.metric("Total Processed", len(st.session_state.processing_results))
-        st.markdown('</div>', unsafe_allow_html=True)
+        render_metric_card("Total Processed", total)
     
     with col2:
-        successful = sum(1 for r in st.session_state.processing_results if r.success)
-        st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-        st.metric("Successful", successful)
-        st.markdown('</div>', unsafe_allow_html=True)
+        render_metric_card("Successful", successful)
     
     with col3:
-        failed = len(st.session_state.processing_results) - successful
-        st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-        st.metric("Failed", failed)
-        st.markdown('</div>', unsafe_allow_html=True)
+        render_metric_card("Failed", total - successful)
     
     with col4:
-        avg_time = sum(r.processing_time or 0 for r in st.session_state.processing_results) / max(len(st.session_state.processing_results), 1)
-        st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-        st.metric("Avg Time (s)", f"{avg_time:.1f}")
-        st.markdown('</div>', unsafe_allow_html=True)
+        render_metric_card("Avg Time (s)", f"{avg_time:.1f}")
     
     st.divider()
     
     # Agent workflow visualization
     st.subheader("🔄 5-Agent Workflow")
     
-    agent_info = [
-        {
-            "name": "Contract Reader Agent",
-            "description": "Extracts and parses employee contract data from PDF documents",
-            "icon": "📄",
-            "status": "ready"
-        },
-        {
-            "name": "Salary Breakdown Agent", 
-            "description": "Calculates comprehensive salary breakdown with all deductions",
-            "icon": "💰",
-            "status": "ready"
-        },
-        {
-            "name": "Compliance Mapper Agent",
-            "description": "RAG-enabled validation against latest government rules",
-            "icon": "⚖️",
-            "status": "ready"
-        },
-        {
-            "name": "Anomaly Detector Agent",
-            "description": "Detects calculation errors and data inconsistencies",
-            "icon": "🔍",
-            "status": "ready"
-        },
-        {
-            "name": "Paystub Generator Agent",
-            "description": "Generates professional paystubs and tax documents",
-            "icon": "📋",
-            "status": "ready"
-        }
-    ]
-    
-    for i, agent in enumerate(agent_info):
+    for i, agent in enumerate(AGENT_INFO):
         with st.container():
             st.markdown(f"""
             <div class="agent-card">
@@ -219,7 +303,7 @@ def main_dashboard():
             </div>
             """, unsafe_allow_html=True)
             
-            if i < len(agent_info) - 1:
+            if i < len(AGENT_INFO) - 1:
                 st.markdown("<div style='text-align: center; margin: 1rem 0;'>⬇️</div>", unsafe_allow_html=True)
 
 def contract_processing_page():
@@ -271,7 +355,8 @@ def process_contract(uploaded_file, workflow, options):
     
     # Save uploaded file temporarily
     with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-        tmp_file.write(uploaded_file.read())
+        uploaded_file.seek(0)
+        shutil.copyfileobj(uploaded_file, tmp_file, 1024 * 1024)
         contract_path = tmp_file.name
     
     try:
@@ -301,23 +386,39 @@ def process_contract(uploaded_file, workflow, options):
             status_text.info("🚀 Starting payroll processing...")
             progress_bar.progress(10)
             
-            # Process the contract
-            result = workflow.process_contract_sync(contract_path)
-            
+            # Process the contract in the background and follow agent events as they arrive
+            events = queue.Queue()
+            completed_agents = 0
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                future = executor.submit(workflow.process_contract_concurrent, contract_path, events)
+
+                while not (future.done() and events.empty()):
+                    try:
+                        agent_key, event = events.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+
+                    agent_name = agent_key.replace("_", " ").title()
+                    if event == TASK_STARTED:
+                        status_text.info(f"🔄 Running {agent_name}...")
+                        if options["real_time_updates"] and agent_name in agent_status:
+                            agent_status[agent_name].warning(f"🔄 {agent_name}")
+                        continue
+
+                    completed_agents += 1
+                    progress_bar.progress(10 + completed_agents * 18)
+                    if options["real_time_updates"] and agent_name in agent_status:
+                        if event == TASK_COMPLETED:
+                            agent_status[agent_name].success(f"✅ {agent_name}")
+                        else:
+                            agent_status[agent_name].error(f"❌ {agent_name}")
+
+                result = future.result()
+
             # Update progress based on result
             if result.success:
                 progress_bar.progress(100)
                 status_text.success("✅ Processing completed successfully!")
-                
-                # Update agent status
-                if options["real_time_updates"]:
-                    for agent_log in result.agent_logs:
-                        agent_name = agent_log["agent"].replace("Agent", "").replace("_", " ").title()
-                        if agent_name in agent_status:
-                            if agent_log["success"]:
-                                agent_status[agent_name].success(f"✅ {agent_name}")
-                            else:
-                                agent_status[agent_name].error(f"❌ {agent_name}")
             else:
                 progress_bar.progress(50)
                 status_text.error("❌ Processing failed!")
@@ -335,10 +436,7 @@ def process_contract(uploaded_file, workflow, options):
     
     finally:
         # Clean up temporary file
-        try:
-            os.unlink(contract_path)
-        except:
-            pass
+        Path(contract_path).unlink(missing_ok=True)
 
 def display_processing_result(result: ProcessingResult, options: Dict[str, Any]):
     """Display the processing result"""
@@ -356,34 +454,38 @@ def display_processing_result(result: ProcessingResult, options: Dict[str, Any])
             for error in result.errors:
                 st.write(f"• {error}")
     
-    # Tabs for different result sections
-    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📄 Contract Data", "💰 Salary Breakdown", "⚖️ Compliance", "🔍 Anomalies", "📋 Documents"])
+    # Render only the selected section; picking one from the processing page
+    # moves to the result detail page so the result survives the rerun
+    section = st.radio(
+        "Section",
+        RESULT_SECTIONS,
+        horizontal=True,
+        key="result_tab",
+        on_change=_set_page,
+        args=("result_detail",)
+    )
     
-    with tab1:
+    if section == "📄 Contract Data":
         if result.contract_data:
             display_contract_data(result.contract_data, options)
         else:
             st.warning("No contract data available")
-    
-    with tab2:
+    elif section == "💰 Salary Breakdown":
         if result.salary_data:
             display_salary_breakdown(result.salary_data, options)
         else:
             st.warning("No salary data available")
-    
-    with tab3:
+    elif section == "⚖️ Compliance":
         if result.compliance_data:
             display_compliance_data(result.compliance_data, options)
         else:
             st.warning("No compliance data available")
-    
-    with tab4:
+    elif section == "🔍 Anomalies":
         if result.anomalies_data:
             display_anomaly_data(result.anomalies_data, options)
         else:
             st.warning("No anomaly data available")
-    
-    with tab5:
+    else:
         if result.paystub_data:
             display_documents(result.paystub_data, options)
         else:
@@ -436,7 +538,46 @@ def display_contract_data(contract_data, options):
     if options.get("show_raw_data"):
         st.subheader("🔍 Raw Extracted Text")
         with st.expander("View raw contract text"):
-            st.text(contract_data.extracted_text[:2000] + "..." if len(contract_data.extracted_text) > 2000 else contract_data.extracted_text)
+            text = contract_data.extracted_text or ""
+            st.text(text[:2000] + ("..." if len(text) > 2000 else ""))
+
+@st.cache_data(show_spinner=False, max_entries=64, ttl=3600)
+def _salary_fig_json(earnings: tuple, deduction_items: tuple) -> str:
+    """Build the earnings/deductions pie charts from (label, amount) pairs as figure JSON
+
+    deduction_items is expected to hold only the non-zero deductions.
+    """
+    
+    # Pie chart for salary components
+    fig = make_subplots(
+        rows=1, cols=2,
+        specs=[[{"type": "pie"}, {"type": "pie"}]],
+        subplot_titles=("Earnings Breakdown", "Deductions Breakdown")
+    )
+    
+    # Earnings pie chart
+    earnings_labels = [k for k, _ in earnings]
+    earnings_values = [v for _, v in earnings]
+    
+    fig.add_trace(go.Pie(
+        labels=earnings_labels,
+        values=earnings_values,
+        name="Earnings"
+    ), row=1, col=1)
+    
+    # Deductions pie chart (only non-zero values)
+    deduction_labels = [k for k, _ in deduction_items]
+    deduction_values = [v for _, v in deduction_items]
+    
+    if deduction_values:
+        fig.add_trace(go.Pie(
+            labels=deduction_labels,
+            values=deduction_values,
+            name="Deductions"
+        ), row=1, col=2)
+    
+    fig.update_layout(showlegend=True, height=400)
+    return fig.to_json()
 
 def display_salary_breakdown(salary_data, options):
     """Display salary breakdown with visualizations"""
@@ -446,13 +587,13 @@ def display_salary_breakdown(salary_data, options):
     with col1:
         st.subheader("💰 Earnings")
         
-        earnings = {
-            "Basic Salary": salary_data.basic_salary,
-            "HRA": salary_data.hra,
-            "Allowances": salary_data.allowances
-        }
+        earnings = (
+            ("Basic Salary", salary_data.basic_salary),
+            ("HRA", salary_data.hra),
+            ("Allowances", salary_data.allowances)
+        )
         
-        for component, amount in earnings.items():
+        for component, amount in earnings:
             st.metric(component, f"₹{amount:,.2f}")
         
         st.metric("**Gross Salary**", f"₹{salary_data.gross_salary:,.2f}")
@@ -471,10 +612,13 @@ def display_salary_breakdown(salary_data, options):
             "Others": deductions.other_deductions
         }
         
-        total_deductions = sum(deduction_items.values())
-        
+        # Single pass: accumulate the total and keep the non-zero items for display and charting
+        total_deductions = 0.0
+        nonzero_deductions = []
         for component, amount in deduction_items.items():
+            total_deductions += amount
             if amount > 0:
+                nonzero_deductions.append((component, amount))
                 st.metric(component, f"₹{amount:,.2f}")
         
         st.metric("**Total Deductions**", f"₹{total_deductions:,.2f}")
@@ -492,36 +636,8 @@ def display_salary_breakdown(salary_data, options):
     # Salary visualization
     st.subheader("📊 Salary Breakdown Chart")
     
-    # Pie chart for salary components
-    fig = make_subplots(
-        rows=1, cols=2,
-        specs=[[{"type": "pie"}, {"type": "pie"}]],
-        subplot_titles=("Earnings Breakdown", "Deductions Breakdown")
-    )
-    
-    # Earnings pie chart
-    earnings_labels = list(earnings.keys())
-    earnings_values = list(earnings.values())
-    
-    fig.add_trace(go.Pie(
-        labels=earnings_labels,
-        values=earnings_values,
-        name="Earnings"
-    ), row=1, col=1)
-    
-    # Deductions pie chart (only non-zero values)
-    deduction_labels = [k for k, v in deduction_items.items() if v > 0]
-    deduction_values = [v for v in deduction_items.values() if v > 0]
-    
-    if deduction_values:
-        fig.add_trace(go.Pie(
-            labels=deduction_labels,
-            values=deduction_values,
-            name="Deductions"
-        ), row=1, col=2)
-    
-    fig.update_layout(showlegend=True, height=400)
-    st.plotly_chart(fig, use_container_width=True)
+    fig = go.Figure(json.loads(_salary_fig_json(earnings, tuple(nonzero_deductions))))
+    st.plotly_chart(fig, use_container_width=True, theme=None, config=PLOTLY_STATIC_CONFIG)
     
     # Calculation notes
     if salary_data.calculation_notes:
@@ -532,20 +648,8 @@ def display_compliance_data(compliance_data, options):
     """Display compliance validation results"""
     
     # Compliance status
-    status_color = {
-        "COMPLIANT": "success",
-        "NON_COMPLIANT": "error", 
-        "REVIEW_REQUIRED": "warning"
-    }
-    
-    status_icon = {
-        "COMPLIANT": "✅",
-        "NON_COMPLIANT": "❌",
-        "REVIEW_REQUIRED": "⚠️"
-    }
-    
     status = compliance_data.compliance_status
-    getattr(st, status_color[status])(f"{status_icon[status]} Compliance Status: {status}")
+    COMPLIANCE_STATUS_FN[status](f"{COMPLIANCE_STATUS_ICON[status]} Compliance Status: {status}")
     
     # Confidence score
     st.metric("Confidence Score", f"{compliance_data.confidence_score:.2%}")
@@ -591,20 +695,8 @@ def display_anomaly_data(anomalies_data, options):
     """Display anomaly detection results"""
     
     # Overall status
-    status_color = {
-        "NORMAL": "success",
-        "REVIEW_REQUIRED": "warning",
-        "CRITICAL": "error"
-    }
-    
-    status_icon = {
-        "NORMAL": "✅",
-        "REVIEW_REQUIRED": "⚠️", 
-        "CRITICAL": "🚨"
-    }
-    
     status = anomalies_data.overall_status
-    getattr(st, status_color[status])(f"{status_icon[status]} Anomaly Status: {status}")
+    ANOMALY_STATUS_FN[status](f"{ANOMALY_STATUS_ICON[status]} Anomaly Status: {status}")
     
     # Metrics
     col1, col2, col3 = st.columns(3)
@@ -624,13 +716,6 @@ def display_anomaly_data(anomalies_data, options):
         st.subheader("🔍 Detected Anomalies")
         
         for i, anomaly in enumerate(anomalies_data.anomalies, 1):
-            severity_color = {
-                "LOW": "info",
-                "MEDIUM": "warning", 
-                "HIGH": "error",
-                "CRITICAL": "error"
-            }
-            
             with st.expander(f"Anomaly {i}: {anomaly.description}"):
                 col1, col2 = st.columns(2)
                 
@@ -649,6 +734,10 @@ def display_anomaly_data(anomalies_data, options):
         st.subheader("📝 Review Notes")
         st.info(anomalies_data.review_notes)
 
+def _read_bytes(path: str) -> bytes:
+    """Read a generated document from disk"""
+    return Path(path).read_bytes()
+
 def display_documents(paystub_data, options):
     """Display generated documents"""
     
@@ -669,12 +758,13 @@ def display_documents(paystub_data, options):
     # Download button
     if hasattr(paystub_data, 'pdf_path') and paystub_data.pdf_path:
         try:
-            with open(paystub_data.pdf_path, 'rb') as pdf_file:
-                pdf_data = pdf_file.read()
+            if not os.path.exists(paystub_data.pdf_path):
+                raise FileNotFoundError(paystub_data.pdf_path)
             
+            # Read the PDF only when the user actually downloads it
             st.download_button(
                 label="📥 Download Paystub PDF",
-                data=pdf_data,
+                data=functools.partial(_read_bytes, paystub_data.pdf_path),
                 file_name=f"paystub_{paystub_data.employee_info.employee_id or 'employee'}_{paystub_data.pay_period.replace(' ', '_')}.pdf",
                 mime="application/pdf",
                 type="primary"
@@ -686,15 +776,9 @@ def display_documents(paystub_data, options):
     if st.button("📄 Export as JSON"):
         try:
             # Create export data
-            export_data = {
-                "employee_info": paystub_data.employee_info.dict(),
-                "salary_breakdown": paystub_data.salary_breakdown.dict(),
-                "compliance_info": paystub_data.compliance_info.dict(),
-                "pay_period": paystub_data.pay_period,
-                "generated_date": paystub_data.generated_date.isoformat()
-            }
+            export_data = paystub_data.model_dump(include=EXPORT_FIELDS, mode="json")
             
-            json_data = json.dumps(export_data, indent=2, default=str)
+            json_data = orjson.dumps(export_data, option=orjson.OPT_INDENT_2)
             
             st.download_button(
                 label="📥 Download JSON Data",
@@ -705,6 +789,41 @@ def display_documents(paystub_data, options):
         except Exception as e:
             st.error(f"Error exporting JSON: {e}")
 
+def _results_key(results: List[ProcessingResult]) -> tuple:
+    """Content-based cache key for the processing history (st.cache_data is shared across sessions)"""
+    return tuple((r.employee_id, r.processing_time, r.success) for r in results)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _results_frame(results_key: tuple, _results: List[ProcessingResult]) -> pd.DataFrame:
+    """Build a per-result DataFrame once so summary metrics are vectorized pandas reductions"""
+    return pd.DataFrame({
+        "success": [r.success for r in _results],
+        "processing_time": [r.processing_time or 0.0 for r in _results],
+        "has_contract": [r.contract_data is not None for r in _results],
+        "employee_id": [r.employee_id for r in _results],
+    })
+
+@st.cache_data(show_spinner=False, max_entries=64, ttl=3600)
+def _trend_df(trend_rows: tuple) -> pd.DataFrame:
+    """Build the processing trend DataFrame from (process #, success, time, employee) rows"""
+    return pd.DataFrame(list(trend_rows), columns=["Process #", "Success", "Processing Time", "Employee ID"])
+
+@st.cache_data(show_spinner=False, max_entries=64, ttl=3600)
+def _build_trend_figure(df: pd.DataFrame) -> go.Figure:
+    """Build the processing time trend line chart"""
+    return px.line(df, x="Process #", y="Processing Time", 
+                   title="Processing Time Trend",
+                   labels={"Processing Time": "Time (seconds)"})
+
+@st.cache_data(show_spinner=False, max_entries=64, ttl=3600)
+def _build_salary_analytics_figures(df_salary: pd.DataFrame) -> tuple:
+    """Build the gross salary distribution and gross vs net charts"""
+    box_fig = px.box(df_salary, y="Gross Salary", title="Gross Salary Distribution")
+    scatter_fig = px.scatter(df_salary, x="Gross Salary", y="Net Salary", 
+                             title="Gross vs Net Salary",
+                             hover_data=["Employee"])
+    return box_fig, scatter_fig
+
 def analytics_page():
     """Analytics and reporting page"""
     st.title("📊 Analytics & Reports")
@@ -718,21 +837,23 @@ def analytics_page():
     # Summary metrics
     st.subheader("📈 Summary Metrics")
     
+    df_results = _results_frame(_results_key(results), results)
+    
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Total Processed", len(results))
+        st.metric("Total Processed", len(df_results))
     
     with col2:
-        success_rate = sum(1 for r in results if r.success) / len(results) * 100
+        success_rate = df_results["success"].mean() * 100
         st.metric("Success Rate", f"{success_rate:.1f}%")
     
     with col3:
-        avg_time = sum(r.processing_time or 0 for r in results) / len(results)
+        avg_time = df_results["processing_time"].mean()
         st.metric("Avg Processing Time", f"{avg_time:.1f}s")
     
     with col4:
-        total_employees = len([r for r in results if r.success and r.contract_data])
+        total_employees = int((df_results["success"] & df_results["has_contract"]).sum())
         st.metric("Employees Processed", total_employees)
     
     # Processing trends
@@ -740,51 +861,42 @@ def analytics_page():
     
     if len(results) > 1:
         # Create trend data
-        trend_data = []
-        for i, result in enumerate(results):
-            trend_data.append({
-                "Process #": i + 1,
-                "Success": result.success,
-                "Processing Time": result.processing_time or 0,
-                "Employee ID": result.employee_id
-            })
+        trend_rows = tuple(
+            (i + 1, result.success, result.processing_time or 0, result.employee_id)
+            for i, result in enumerate(results)
+        )
         
-        df = pd.DataFrame(trend_data)
+        df = _trend_df(trend_rows)
         
         # Success rate over time
-        fig = px.line(df, x="Process #", y="Processing Time", 
-                     title="Processing Time Trend",
-                     labels={"Processing Time": "Time (seconds)"})
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(_build_trend_figure(df), use_container_width=True)
     
     # Salary analytics
     if any(r.salary_data for r in results if r.success):
         st.subheader("💰 Salary Analytics")
         
-        salary_data = []
-        for result in results:
-            if result.success and result.salary_data:
-                salary_data.append({
-                    "Employee": result.employee_id,
-                    "Gross Salary": result.salary_data.gross_salary,
-                    "Net Salary": result.salary_data.net_salary,
-                    "Total Deductions": sum(result.salary_data.deductions.dict().values())
-                })
+        salary_rows = [
+            (
+                result.employee_id,
+                result.salary_data.gross_salary,
+                result.salary_data.net_salary,
+                result.salary_data.deductions.total
+            )
+            for result in results
+            if result.success and result.salary_data
+        ]
         
-        if salary_data:
-            df_salary = pd.DataFrame(salary_data)
+        if salary_rows:
+            df_salary = pd.DataFrame.from_records(salary_rows, columns=SALARY_ANALYTICS_COLUMNS)
+            box_fig, scatter_fig = _build_salary_analytics_figures(df_salary)
             
             col1, col2 = st.columns(2)
             
             with col1:
-                fig = px.box(df_salary, y="Gross Salary", title="Gross Salary Distribution")
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(box_fig, use_container_width=True)
             
             with col2:
-                fig = px.scatter(df_salary, x="Gross Salary", y="Net Salary", 
-                               title="Gross vs Net Salary",
-                               hover_data=["Employee"])
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(scatter_fig, use_container_width=True)
 
 def main():
     """Main application function"""
@@ -798,16 +910,8 @@ def main():
     # Navigation menu
     st.sidebar.subheader("📍 Navigation")
     
-    menu_options = {
-        "🏠 Dashboard": "dashboard",
-        "📤 Process Contract": "process",
-        "📊 Analytics": "analytics"
-    }
-    
-    for label, key in menu_options.items():
-        if st.sidebar.button(label, key=f"nav_{key}"):
-            st.session_state.page = key
-            st.rerun()
+    for label, key in MENU_OPTIONS.items():
+        st.sidebar.button(label, key=f"nav_{key}", on_click=_set_page, args=(key,))
     
     # Page routing
     if page == "dashboard":
@@ -1,45 +1,214 @@
 import os
-import json
+import re
+import asyncio
+import bisect
+import hashlib
 import logging
+import functools
 import tempfile
+import threading
 import time
 from typing import Dict, Any, List, Optional
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-from io import BytesIO
+from uuid import uuid4
+import numpy as np
 import pandas as pd
+from pydantic import BaseModel, Field, ValidationError
 
 # PDF and document processing
-from PyPDF2 import PdfReader
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
+import fitz  # PyMuPDF
+# reportlab is imported lazily in the paystub helpers; it is heavy and only needed for PDFs
 
 # LangChain and AI
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain_core.messages import HumanMessage, SystemMessage
 
 # Local imports
 from models import (
     ContractData, EmployeeInfo, SalaryStructure, SalaryBreakdown, 
     Deductions, ComplianceValidation, ComplianceStatus, AnomalyDetection, 
+    ApplicableRules, PFRules, ESIRules, TaxRules, ProfessionalTaxRules, 
     Anomaly, AnomalyStatus, SeverityLevel, PaystubData, AgentResult
 )
 from rag_system import PayrollRAGSystem
+from payroll_constants import PF_RATE, PF_CAP, ESI_RATE, ESI_THRESHOLD, TDS_SLABS, STD_DEDUCTION, CESS
 
 logger = logging.getLogger(__name__)
 
+# Bump when the contract parsing prompt changes so cached parses are invalidated
+SYSTEM_PROMPT_VERSION = "v1"
+CONTRACT_TEXT_LIMIT = 15000
+CONTRACT_PARSE_CACHE_SIZE = 1024
+
+# Kept byte-identical across calls and sent ahead of the contract text so
+# Gemini's implicit prefix caching can reuse it between requests
+_SYSTEM_PROMPT = """You are an expert HR document parser. Extract employee salary and contract details from the provided employment contract text.
+
+Return ONLY a valid JSON object with this exact structure:
+{
+  "employee_info": {
+    "employee_name": "string or null",
+    "employee_id": "string or null",
+    "department": "string or null",
+    "designation": "string or null",
+    "location": "string or null",
+    "joining_date": "string or null",
+    "pan_number": "string or null",
+    "pf_number": "string or null",
+    "esi_number": "string or null"
+  },
+  "salary_structure": {
+    "basic": number or null,
+    "hra": number or null,
+    "allowances": number or null,
+    "special_allowance": number or null,
+    "medical_allowance": number or null,
+    "transport_allowance": number or null,
+    "meal_allowance": number or null,
+    "gross": number or null,
+    "variable_pay": number or null,
+    "bonus": number or null,
+    "is_annual": boolean
+  },
+  "benefits": {},
+  "special_clauses": [],
+  "parsing_confidence": number_between_0_and_1,
+  "notes": "string explaining any assumptions or clarifications"
+}
+
+Important guidelines:
+1. If amounts appear to be annual (> 200,000), set "is_annual": true
+2. Extract all salary components mentioned
+3. Include any special allowances or benefits in the appropriate fields
+4. Set parsing_confidence based on clarity of the document
+5. Add notes explaining any assumptions made during parsing
+6. If a field is not found, set it to null
+7. Ensure all numeric fields are numbers, not strings
+
+Respond with JSON only, no explanations."""
+
+# Markdown code fence the model sometimes wraps its JSON in
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+class _LLMContractPayload(BaseModel):
+    """Shape of the JSON requested by _SYSTEM_PROMPT, validated as it is decoded"""
+    employee_info: EmployeeInfo = Field(default_factory=EmployeeInfo)
+    salary_structure: SalaryStructure = Field(default_factory=SalaryStructure)
+    benefits: Optional[Dict[str, Any]] = {}
+    special_clauses: Optional[List[str]] = []
+    parsing_confidence: Optional[float] = 0.8
+    notes: Optional[str] = ""
+
+# Exact-match cache of LLM contract parses, keyed by prompt version + contract text
+_contract_parse_cache: "OrderedDict[str, _LLMContractPayload]" = OrderedDict()
+# Guards the parse caches when contracts are parsed concurrently
+_parse_cache_lock = threading.Lock()
+
+def _contract_cache_key(contract_text: str) -> str:
+    """Hash the text the LLM actually sees together with the prompt version"""
+    payload = f"{SYSTEM_PROMPT_VERSION}\n{contract_text}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# Near-duplicate contracts (same template, different employee) reuse a prior parse
+SEMANTIC_CACHE_THRESHOLD = 0.97
+SEMANTIC_CACHE_SIZE = 256
+
+# Label separator is required and the amount must start with a digit, so prose like
+# "bonus, if any" or "basic, capped at" never captures a bare comma
+_AMOUNT = r"\s*[:\-]\s*(?:₹|rs\.?|inr)?\s*(\d[\d,]*(?:\.\d+)?)\b"
+
+# Per-employee fields of contracts built from one template, one pattern per EmployeeInfo
+# field. Labels must start a line, so "Company Name: ..." is never read as the employee's
+# name; a field populated in the cached parse that can't be re-extracted voids the reuse
+_EMPLOYEE_FIELD_PATTERNS = {
+    "employee_name": re.compile(r"(?im)^\s*(?:employee\s+)?(?:full\s+)?name\s*[:\-]\s*(\S[^\n]*?)\s*$"),
+    "employee_id": re.compile(r"(?im)^\s*(?:employee|emp\.?)\s*(?:id|code|no\.?|number)\s*[:\-]\s*([A-Za-z0-9\-/]+)"),
+    "department": re.compile(r"(?im)^\s*(?:department|dept\.?)\s*[:\-]\s*(\S[^\n]*?)\s*$"),
+    "designation": re.compile(r"(?im)^\s*(?:designation|job\s+title|position)\s*[:\-]\s*(\S[^\n]*?)\s*$"),
+    "location": re.compile(r"(?im)^\s*(?:work\s+|job\s+)?location\s*[:\-]\s*(\S[^\n]*?)\s*$"),
+    "joining_date": re.compile(r"(?im)^\s*(?:date\s+of\s+joining|joining\s+date|doj)\s*[:\-]\s*(\S[^\n]*?)\s*$"),
+    "pan_number": re.compile(r"(?im)^\s*pan(?:\s+(?:no\.?|number|card))?\s*[:\-]\s*([A-Z]{5}\d{4}[A-Z])\b"),
+    "pf_number": re.compile(r"(?im)^\s*(?:pf|uan|provident\s+fund)(?:\s+(?:account\s+)?(?:no\.?|number))?\s*[:\-]\s*([A-Za-z0-9\-/]+)"),
+    "esi_number": re.compile(r"(?im)^\s*(?:esi|esic)(?:\s+(?:ip\s+)?(?:no\.?|number))?\s*[:\-]\s*([A-Za-z0-9\-/]+)"),
+}
+
+# Whether a contract states its amounts annually; a cached parse is only reused for a
+# contract that uses the same convention
+# Contract embeddings run here, alongside the LLM call, instead of ahead of it
+_embed_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="contract-embed")
+
+_ANNUAL_MARKER_RE = re.compile(r"(?i)per\s+annum|\bp\.\s?a\.|\bctc\b|\byearly\b|\bannual(?:ly)?\b")
+
+_SALARY_FIELD_PATTERNS = {
+    "basic": re.compile(r"(?i)\bbasic(?:\s+salary|\s+pay)?\b" + _AMOUNT),
+    "hra": re.compile(r"(?i)\b(?:hra|house\s+rent\s+allowance)\b" + _AMOUNT),
+    "special_allowance": re.compile(r"(?i)\bspecial\s+allowance\b" + _AMOUNT),
+    "medical_allowance": re.compile(r"(?i)\bmedical\s+allowance\b" + _AMOUNT),
+    "transport_allowance": re.compile(r"(?i)\b(?:transport|conveyance)\s+allowance\b" + _AMOUNT),
+    "meal_allowance": re.compile(r"(?i)\b(?:meal|food)\s+allowance\b" + _AMOUNT),
+    "gross": re.compile(r"(?i)\bgross(?:\s+salary|\s+pay)?\b" + _AMOUNT),
+    "variable_pay": re.compile(r"(?i)\bvariable\s+pay\b" + _AMOUNT),
+    "bonus": re.compile(r"(?i)\bbonus\b" + _AMOUNT),
+}
+
+# Monthly professional tax slabs per state: (upper bound of gross, tax) pairs
+_PT_SLABS = {
+    "karnataka": [(15000, 0), (25000, 200), (float("inf"), 300)],
+    "maharashtra": [(5000, 0), (10000, 175), (float("inf"), 200)],
+    "west bengal": [(10000, 110), (15000, 130), (float("inf"), 200)],
+    "tamil nadu": [(float("inf"), 200)],
+    "default": [(15000, 0), (float("inf"), 200)],
+}
+_PT_ALIASES = {"bengal": "west bengal"}
+
+# (thresholds, amounts) per state, ready for bisect
+_PT_TABLES = {
+    state: (tuple(limit for limit, _ in slabs), tuple(float(tax) for _, tax in slabs))
+    for state, slabs in _PT_SLABS.items()
+}
+
+def _pt_state(location: str) -> str:
+    """Resolve a lowercased location string to a _PT_SLABS key"""
+    state = _PT_ALIASES.get(location, location)
+    if state in _PT_TABLES:
+        return state
+    # Free-form locations such as "bangalore, karnataka"
+    for name in ("karnataka", "maharashtra", "bengal", "tamil nadu"):
+        if name in location:
+            return _PT_ALIASES.get(name, name)
+    return "default"
+
+@functools.lru_cache(maxsize=8)
+def _get_llm(api_key: str, model: str = "gemini-1.5-pro") -> ChatGoogleGenerativeAI:
+    """Return a chat client shared by every agent using the same key and model"""
+    return ChatGoogleGenerativeAI(
+        model=model,
+        temperature=0.1,
+        google_api_key=api_key
+    )
+
+# TDS_SLABS as (lower, upper, rate) bands; the top band is open-ended
+_TDS_BANDS = tuple(
+    (lower, TDS_SLABS[i + 1][0] if i + 1 < len(TDS_SLABS) else float("inf"), rate)
+    for i, (lower, rate) in enumerate(TDS_SLABS)
+)
+
+class ScannedPDFError(Exception):
+    """Raised when a PDF has too little text layer to parse, e.g. a scanned contract"""
+    pass
+
+# Below these, extracted text is headers/footers or OCR noise rather than a contract
+MIN_CONTRACT_CHARS = 200
+MIN_ALPHA_RATIO = 0.15
+
 class BaseAgent:
     """Base class for all payroll agents"""
     
     def __init__(self, name: str, api_key: str):
         self.name = name
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-pro",
-            temperature=0.1,
-            google_api_key=api_key
-        )
+        self.llm = _get_llm(api_key)
     
     def execute(self, input_data: Any) -> AgentResult:
         """Execute the agent's main function"""
@@ -57,7 +226,7 @@ class BaseAgent:
             )
         except Exception as e:
             execution_time = time.time() - start_time
-            logger.error(f"Agent {self.name} failed: {e}")
+            logger.error("Agent %s failed: %s", self.name, e)
             
             return AgentResult(
                 agent_name=self.name,
@@ -76,6 +245,14 @@ class ContractReaderAgent(BaseAgent):
     
     def __init__(self, api_key: str):
         super().__init__("ContractReaderAgent", api_key)
+        self.embeddings = GoogleGenerativeAIEmbeddings(
+            model="models/embedding-001",
+            google_api_key=api_key
+        )
+        self._sem_vectors: List[np.ndarray] = []
+        self._sem_parses: List[_LLMContractPayload] = []
+        self._sem_annual: List[bool] = []  # annual markers in each cached parse's source text
+        self._sys_msg = SystemMessage(content=_SYSTEM_PROMPT)
     
     def _process(self, contract_path: str) -> ContractData:
         """Extract and parse contract data from PDF"""
@@ -91,142 +268,266 @@ class ContractReaderAgent(BaseAgent):
         
         return contract_data
     
-    def _extract_pdf_text(self, contract_path: str) -> str:
-        """Extract text from PDF file"""
+    def batch_process(self, contract_paths: List[str], max_workers: Optional[int] = None,
+                      max_concurrent_llm: int = 8) -> List[AgentResult]:
+        """Read many contracts, returning one AgentResult per path in order
+        
+        PDF text extraction runs in a process pool; the LLM parses then run
+        concurrently, at most max_concurrent_llm at a time.
+        """
+        start_time = time.time()
+        
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            futures = [executor.submit(ContractReaderAgent._extract_pdf_text, path) for path in contract_paths]
+            extracted = []
+            for future in futures:
+                try:
+                    extracted.append(future.result())
+                except Exception as e:
+                    extracted.append(e)
+        
+        return asyncio.run(self._parse_batch(extracted, max_concurrent_llm, start_time))
+    
+    async def _parse_batch(self, extracted: List[Any], max_concurrent_llm: int, start_time: float) -> List[AgentResult]:
+        """Parse extracted contract texts concurrently under a rate-limit semaphore"""
+        semaphore = asyncio.Semaphore(max_concurrent_llm)
+        
+        async def parse_one(text):
+            if isinstance(text, Exception):
+                raise text
+            async with semaphore:
+                parsed = await asyncio.to_thread(self._parse_contract_with_llm, text)
+            return self._structure_contract_data(parsed, text)
+        
+        outcomes = await asyncio.gather(*(parse_one(text) for text in extracted), return_exceptions=True)
+        execution_time = time.time() - start_time
+        
+        results = []
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                logger.error("Agent %s failed: %s", self.name, outcome)
+                results.append(AgentResult(
+                    agent_name=self.name,
+                    success=False,
+                    output=None,
+                    error_message=str(outcome),
+                    execution_time=execution_time
+                ))
+            else:
+                results.append(AgentResult(
+                    agent_name=self.name,
+                    success=True,
+                    output=outcome,
+                    execution_time=execution_time,
+                    confidence_score=outcome.parsing_confidence
+                ))
+        return results
+    
+    @staticmethod
+    def _extract_pdf_text(contract_path: str) -> str:
+        """Extract up to CONTRACT_TEXT_LIMIT characters of text from PDF file"""
         try:
-            with open(contract_path, 'rb') as file:
-                reader = PdfReader(file)
-                text = ""
-                for page in reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                
-                if not text.strip():
-                    raise ValueError("No text could be extracted from the PDF")
-                
-                logger.info(f"Extracted {len(text)} characters from PDF")
-                return text.strip()
+            # Only the first CONTRACT_TEXT_LIMIT characters reach the LLM, so stop
+            # reading pages once that much text has been collected
+            parts = []
+            collected = 0
+            with fitz.open(contract_path) as doc:
+                for page in doc:
+                    page_text = page.get_text("text")
+                    parts.append(page_text)
+                    collected += len(page_text) + 1
+                    if collected >= CONTRACT_TEXT_LIMIT + 500:
+                        break
+            
+            text = "\n".join(parts)[:CONTRACT_TEXT_LIMIT]
+            
+            text = text.strip()
+            if not text:
+                raise ValueError("No text could be extracted from the PDF")
+            
+            # Catch scanned contracts before spending an LLM call on them
+            sample = text[:5000]
+            alpha_ratio = sum(c.isalpha() for c in sample) / len(sample)
+            if len(text) < MIN_CONTRACT_CHARS or alpha_ratio < MIN_ALPHA_RATIO:
+                raise ScannedPDFError(
+                    f"PDF has almost no text layer ({len(text)} characters, "
+                    f"{alpha_ratio:.0%} letters); it looks scanned and needs OCR"
+                )
+            
+            logger.info("Extracted %d characters from PDF", len(text))
+            return text
                 
+        except ScannedPDFError:
+            raise
         except Exception as e:
             raise Exception(f"PDF extraction failed: {e}")
     
-    def _parse_contract_with_llm(self, contract_text: str) -> Dict[str, Any]:
+    def _parse_contract_with_llm(self, contract_text: str) -> _LLMContractPayload:
         """Use LLM to extract structured contract information"""
         
-        system_prompt = """You are an expert HR document parser. Extract employee salary and contract details from the provided employment contract text.
-
-Return ONLY a valid JSON object with this exact structure:
-{
-  "employee_info": {
-    "employee_name": "string or null",
-    "employee_id": "string or null",
-    "department": "string or null",
-    "designation": "string or null",
-    "location": "string or null",
-    "joining_date": "string or null",
-    "pan_number": "string or null",
-    "pf_number": "string or null",
-    "esi_number": "string or null"
-  },
-  "salary_structure": {
-    "basic": number or null,
-    "hra": number or null,
-    "allowances": number or null,
-    "special_allowance": number or null,
-    "medical_allowance": number or null,
-    "transport_allowance": number or null,
-    "meal_allowance": number or null,
-    "gross": number or null,
-    "variable_pay": number or null,
-    "bonus": number or null,
-    "is_annual": boolean
-  },
-  "benefits": {},
-  "special_clauses": [],
-  "parsing_confidence": number_between_0_and_1,
-  "notes": "string explaining any assumptions or clarifications"
-}
+        cache_key = _contract_cache_key(contract_text)
+        with _parse_cache_lock:
+            cached = _contract_parse_cache.get(cache_key)
+            if cached is not None:
+                _contract_parse_cache.move_to_end(cache_key)
+        if cached is not None:
+            logger.info("Using cached contract parse")
+            return cached.model_copy(deep=True)
 
-Important guidelines:
-1. If amounts appear to be annual (> 200,000), set "is_annual": true
-2. Extract all salary components mentioned
-3. Include any special allowances or benefits in the appropriate fields
-4. Set parsing_confidence based on clarity of the document
-5. Add notes explaining any assumptions made during parsing
-6. If a field is not found, set it to null
-7. Ensure all numeric fields are numbers, not strings
-
-Respond with JSON only, no explanations."""
+        embedding = _embed_executor.submit(self._embed_contract, contract_text)
+        with _parse_cache_lock:
+            have_similar_candidates = bool(self._sem_vectors)
+        # The lookup needs the vector up front; with nothing cached yet there is
+        # nothing to match, so the embedding only has to be ready for _remember_parse
+        if have_similar_candidates:
+            similar = self._find_similar_parse(embedding.result(), contract_text)
+            if similar is not None:
+                return similar
 
         try:
-            human_prompt = f"Contract text to parse:\n\n{contract_text[:15000]}"  # Limit text length
+            human_prompt = f"Contract text to parse:\n\n{contract_text}"  # Already capped at extraction
             
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=human_prompt)
-            ]
+            messages = [self._sys_msg, HumanMessage(content=human_prompt)]
             
             response = self.llm.invoke(messages)
             result_text = response.content.strip()
             
             # Clean up response (remove code blocks if present)
-            if result_text.startswith("```"):
-                result_text = result_text.split("```")[1]
-                if result_text.startswith("json"):
-                    result_text = result_text[4:]
+            result_text = _FENCE_RE.sub("", result_text).strip()
             
-            # Parse JSON
-            parsed = json.loads(result_text)
+            # Parse and validate JSON in a single pass
+            parsed = _LLMContractPayload.model_validate_json(result_text)
             logger.info("Successfully parsed contract with LLM")
+            
+            with _parse_cache_lock:
+                _contract_parse_cache[cache_key] = parsed.model_copy(deep=True)
+                if len(_contract_parse_cache) > CONTRACT_PARSE_CACHE_SIZE:
+                    _contract_parse_cache.popitem(last=False)
+            self._remember_parse(embedding.result(), parsed, contract_text)
             return parsed
             
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse LLM response as JSON: {e}")
-            raise Exception(f"LLM response was not valid JSON: {e}")
+        except ValidationError as e:
+            logger.error("Failed to parse LLM response as contract JSON: %s", e)
+            raise Exception(f"LLM response was not valid contract JSON: {e}")
         except Exception as e:
-            logger.error(f"Contract parsing with LLM failed: {e}")
+            logger.error("Contract parsing with LLM failed: %s", e)
             raise Exception(f"Contract parsing failed: {e}")
     
-    def _structure_contract_data(self, parsed_data: Dict[str, Any], extracted_text: str) -> ContractData:
-        """Structure the parsed data into ContractData model"""
+    def _embed_contract(self, contract_text: str) -> Optional[np.ndarray]:
+        """Embed the contract text as a unit vector, or None if embedding fails"""
         try:
-            # Create employee info
-            emp_info_data = parsed_data.get("employee_info", {})
-            employee_info = EmployeeInfo(**emp_info_data)
-            
-            # Create salary structure
-            salary_data = parsed_data.get("salary_structure", {})
-            salary_structure = SalaryStructure(**salary_data)
+            vector = np.asarray(
+                self.embeddings.embed_query(contract_text),
+                dtype=np.float32
+            )
+            norm = np.linalg.norm(vector)
+            return vector / norm if norm else None
+        except Exception as e:
+            logger.warning("Contract embedding failed, skipping semantic cache: %s", e)
+            return None
+    
+    def _find_similar_parse(self, vector: Optional[np.ndarray], contract_text: str) -> Optional[_LLMContractPayload]:
+        """Reuse the parse of a near-identical contract with its per-employee fields re-extracted"""
+        with _parse_cache_lock:
+            if vector is None or not self._sem_vectors:
+                return None
             
-            # Convert annual to monthly if needed
-            if salary_structure.is_annual:
-                if salary_structure.basic:
-                    salary_structure.basic = salary_structure.basic / 12
-                if salary_structure.hra:
-                    salary_structure.hra = salary_structure.hra / 12
-                if salary_structure.allowances:
-                    salary_structure.allowances = salary_structure.allowances / 12
-                if salary_structure.gross:
-                    salary_structure.gross = salary_structure.gross / 12
-                # Update the flag
-                salary_structure.is_annual = False
+            scores = np.stack(self._sem_vectors) @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < SEMANTIC_CACHE_THRESHOLD:
+                return None
+            candidate = self._sem_parses[best]
+            candidate_annual = self._sem_annual[best]
+        
+        if bool(_ANNUAL_MARKER_RE.search(contract_text)) != candidate_annual:
+            return None
+        parsed = self._overlay_contract_fields(candidate, contract_text)
+        if parsed is not None:
+            logger.info("Reusing parse of a similar contract (similarity %.3f)", scores[best])
+        return parsed
+    
+    def _overlay_contract_fields(self, cached: _LLMContractPayload, contract_text: str) -> Optional[_LLMContractPayload]:
+        """Copy a cached parse and refill the fields that vary between employees
+        
+        Returns None when any populated field cannot be found in the new text (or the
+        overlay fails in any way), so the caller falls back to a full LLM parse instead
+        of reusing stale values.
+        """
+        try:
+            return self._apply_contract_overlay(cached, contract_text)
+        except Exception as e:
+            logger.warning("Could not reuse similar contract parse, falling back to the LLM: %s", e)
+            return None
+    
+    def _apply_contract_overlay(self, cached: _LLMContractPayload, contract_text: str) -> Optional[_LLMContractPayload]:
+        parsed = cached.model_dump()
+        employee_info = parsed["employee_info"]
+        salary_structure = parsed["salary_structure"]
+        
+        # Every employee field comes from the new text; none is carried over from the
+        # other employee (location, for one, drives the professional tax state)
+        for field, value in employee_info.items():
+            pattern = _EMPLOYEE_FIELD_PATTERNS.get(field)
+            match = pattern.search(contract_text) if pattern else None
+            if match:
+                employee_info[field] = match.group(1).strip()
+            elif value:
+                return None
+        
+        for field, value in salary_structure.items():
+            if field in ("is_annual", "converted_from_annual"):
+                continue
+            pattern = _SALARY_FIELD_PATTERNS.get(field)
+            match = pattern.search(contract_text) if pattern else None
+            if value is None:
+                if match:
+                    return None  # the new contract has a component the cached parse lacks
+                continue
+            if not match:
+                return None
+            salary_structure[field] = float(match.group(1).replace(",", ""))
+        
+        # Re-extracted amounts are in the contract's own units; convert them again if annual
+        salary_structure["is_annual"] = salary_structure["converted_from_annual"]
+        parsed["notes"] = (parsed["notes"] or "") + " Reused parse of a near-identical contract."
+        return _LLMContractPayload.model_validate(parsed)
+    
+    def _remember_parse(self, vector: Optional[np.ndarray], parsed: _LLMContractPayload, contract_text: str):
+        """Add an LLM parse to the semantic cache"""
+        if vector is None:
+            return
+        with _parse_cache_lock:
+            self._sem_vectors.append(vector)
+            self._sem_parses.append(parsed.model_copy(deep=True))
+            self._sem_annual.append(bool(_ANNUAL_MARKER_RE.search(contract_text)))
+            if len(self._sem_vectors) > SEMANTIC_CACHE_SIZE:
+                self._sem_vectors.pop(0)
+                self._sem_parses.pop(0)
+                self._sem_annual.pop(0)
+    
+    def _structure_contract_data(self, parsed_data: _LLMContractPayload, extracted_text: str) -> ContractData:
+        """Structure the parsed data into ContractData model"""
+        try:
+            # Employee info and salary structure were validated while decoding;
+            # SalaryStructure has already converted annual amounts to monthly
+            employee_info = parsed_data.employee_info
+            salary_structure = parsed_data.salary_structure
             
             contract_data = ContractData(
                 employee_info=employee_info,
                 salary_structure=salary_structure,
-                benefits=parsed_data.get("benefits", {}),
-                special_clauses=parsed_data.get("special_clauses", []),
+                benefits=parsed_data.benefits,
+                special_clauses=parsed_data.special_clauses,
                 extracted_text=extracted_text,
-                parsing_confidence=parsed_data.get("parsing_confidence", 0.8),
-                notes=parsed_data.get("notes", "")
+                parsing_confidence=parsed_data.parsing_confidence,
+                notes=parsed_data.notes
             )
             
-            logger.info(f"Structured contract data for employee: {employee_info.employee_name}")
+            logger.info("Structured contract data for employee: %s", employee_info.employee_name)
             return contract_data
             
         except Exception as e:
-            logger.error(f"Failed to structure contract data: {e}")
+            logger.error("Failed to structure contract data: %s", e)
             raise Exception(f"Data structuring failed: {e}")
 
 class SalaryBreakdownAgent(BaseAgent):
@@ -248,7 +549,7 @@ class SalaryBreakdownAgent(BaseAgent):
         deductions = self._calculate_deductions(gross_components, employee_info)
         
         # Step 3: Calculate net salary
-        net_salary = gross_components["total"] - sum(deductions.dict().values())
+        net_salary = gross_components["total"] - deductions.total
         
         # Step 4: Create salary breakdown
         salary_breakdown = SalaryBreakdown(
@@ -263,7 +564,7 @@ class SalaryBreakdownAgent(BaseAgent):
             calculation_notes=self._generate_calculation_notes(gross_components, deductions)
         )
         
-        logger.info(f"Calculated salary breakdown - Gross: ₹{salary_breakdown.gross_salary:,.2f}, Net: ₹{salary_breakdown.net_salary:,.2f}")
+        logger.info("Calculated salary breakdown - Gross: ₹%.2f, Net: ₹%.2f", salary_breakdown.gross_salary, salary_breakdown.net_salary)
         return salary_breakdown
     
     def _calculate_gross_components(self, salary_structure: SalaryStructure) -> Dict[str, float]:
@@ -314,10 +615,10 @@ class SalaryBreakdownAgent(BaseAgent):
         gross = gross_components["total"]
         
         # PF Calculation (12% of basic, capped at ₹1800)
-        pf = min(basic * 0.12, 1800.0) if basic > 0 else 0
+        pf = min(basic * PF_RATE, PF_CAP) if basic > 0 else 0
         
         # ESI Calculation (0.75% of gross if gross <= ₹21,000)
-        esi = gross * 0.0075 if gross <= 21000 else 0
+        esi = gross * ESI_RATE if gross <= ESI_THRESHOLD else 0
         
         # Professional Tax (state-dependent, defaulting to Karnataka rules)
         location = (employee_info.location or "Karnataka").lower()
@@ -340,57 +641,83 @@ class SalaryBreakdownAgent(BaseAgent):
     def _calculate_professional_tax(self, gross_salary: float, location: str) -> float:
         """Calculate professional tax based on location"""
         
-        if "karnataka" in location:
-            if gross_salary <= 15000:
-                return 0
-            elif gross_salary <= 25000:
-                return 200
-            else:
-                return 300
-        elif "maharashtra" in location:
-            if gross_salary <= 5000:
-                return 0
-            elif gross_salary <= 10000:
-                return 175
-            else:
-                return 200
-        elif "west bengal" in location or "bengal" in location:
-            if gross_salary <= 10000:
-                return 110
-            elif gross_salary <= 15000:
-                return 130
-            else:
-                return 200
-        elif "tamil nadu" in location:
-            return 200
-        else:
-            # Default calculation for other states
-            return 200 if gross_salary > 15000 else 0
+        thresholds, amounts = _PT_TABLES[_pt_state(location)]
+        return amounts[bisect.bisect_left(thresholds, gross_salary)]
     
     def _calculate_tds(self, annual_gross: float) -> float:
         """Calculate TDS based on income tax slabs (simplified)"""
         
         # Standard deduction
-        taxable_income = max(0, annual_gross - 50000)
+        taxable_income = max(0, annual_gross - STD_DEDUCTION)
         
         # Income tax calculation (basic slabs)
         tax = 0
-        if taxable_income > 250000:
-            if taxable_income <= 500000:
-                tax = (taxable_income - 250000) * 0.05
-            elif taxable_income <= 1000000:
-                tax = 250000 * 0.05 + (taxable_income - 500000) * 0.20
-            else:
-                tax = 250000 * 0.05 + 500000 * 0.20 + (taxable_income - 1000000) * 0.30
+        for lower, upper, rate in _TDS_BANDS:
+            if taxable_income <= lower:
+                break
+            tax += (min(taxable_income, upper) - lower) * rate
         
         # Add cess (4%)
-        tax_with_cess = tax * 1.04
+        tax_with_cess = tax * CESS
         
         # Monthly TDS
         monthly_tds = tax_with_cess / 12
         
         return monthly_tds
     
+    @classmethod
+    def batch_process(cls, df: pd.DataFrame) -> pd.DataFrame:
+        """Calculate deductions for many employees at once
+        
+        Expects monthly "basic" and "gross" columns and an optional "location"
+        column (defaults to Karnataka). Returns a copy with pf, esi,
+        professional_tax, tds, total_deductions and net_salary columns added,
+        using the same rules as the per-employee path.
+        """
+        basic = df["basic"].to_numpy(dtype=float)
+        gross = df["gross"].to_numpy(dtype=float)
+        
+        if "location" in df:
+            locations = df["location"].fillna("Karnataka").str.lower()
+        else:
+            locations = pd.Series("karnataka", index=df.index)
+        
+        result = df.copy()
+        result["pf"] = np.round(np.where(basic > 0, np.minimum(basic * PF_RATE, PF_CAP), 0.0), 2)
+        result["esi"] = np.round(np.where(gross <= ESI_THRESHOLD, gross * ESI_RATE, 0.0), 2)
+        result["professional_tax"] = np.round(cls._batch_professional_tax(gross, locations), 2)
+        result["tds"] = np.round(cls._batch_tds(gross * 12), 2)
+        
+        total_deductions = (result["pf"] + result["esi"] + result["professional_tax"] + result["tds"]).to_numpy()
+        result["total_deductions"] = total_deductions
+        result["net_salary"] = np.maximum(gross - total_deductions, 0.0)
+        return result
+    
+    @staticmethod
+    def _batch_professional_tax(gross: np.ndarray, locations: pd.Series) -> np.ndarray:
+        """Vectorized counterpart of _calculate_professional_tax"""
+        
+        states = locations.map(_pt_state).to_numpy()
+        professional_tax = np.zeros_like(gross)
+        
+        for state in np.unique(states):
+            thresholds, amounts = _PT_TABLES[state]
+            mask = states == state
+            slab = np.searchsorted(thresholds, gross[mask], side="left")
+            professional_tax[mask] = np.asarray(amounts)[slab]
+        
+        return professional_tax
+    
+    @staticmethod
+    def _batch_tds(annual_gross: np.ndarray) -> np.ndarray:
+        """Vectorized counterpart of _calculate_tds"""
+        
+        taxable_income = np.maximum(annual_gross - STD_DEDUCTION, 0.0)
+        tax = np.zeros_like(taxable_income)
+        for lower, upper, rate in _TDS_BANDS:
+            tax += np.clip(taxable_income - lower, 0.0, upper - lower) * rate
+        return tax * CESS / 12
+    
     def _generate_calculation_notes(self, gross_components: Dict[str, float], deductions: Deductions) -> str:
         """Generate explanation of salary calculations"""
         
@@ -433,34 +760,24 @@ class ComplianceMapperAgent(BaseAgent):
         recommendations = []
         applied_rules = []
         
-        # Validate PF
-        pf_validation = self._validate_pf(salary_breakdown, applicable_rules["pf_rules"])
-        issues.extend(pf_validation["issues"])
-        recommendations.extend(pf_validation["recommendations"])
-        applied_rules.extend(pf_validation["applied_rules"])
-        
-        # Validate ESI
-        esi_validation = self._validate_esi(salary_breakdown, applicable_rules["esi_rules"])
-        issues.extend(esi_validation["issues"])
-        recommendations.extend(esi_validation["recommendations"])
-        applied_rules.extend(esi_validation["applied_rules"])
-        
-        # Validate Professional Tax
-        pt_validation = self._validate_professional_tax(salary_breakdown, applicable_rules["professional_tax_rules"])
-        issues.extend(pt_validation["issues"])
-        recommendations.extend(pt_validation["recommendations"])
-        applied_rules.extend(pt_validation["applied_rules"])
-        
-        # Validate TDS
-        tds_validation = self._validate_tds(salary_breakdown, applicable_rules["tax_rules"])
-        issues.extend(tds_validation["issues"])
-        recommendations.extend(tds_validation["recommendations"])
-        applied_rules.extend(tds_validation["applied_rules"])
-        
-        # Determine overall compliance status
-        compliance_status = ComplianceStatus.COMPLIANT if len(issues) == 0 else ComplianceStatus.NON_COMPLIANT
-        if any("review" in issue.lower() for issue in issues):
+        # Validators append straight into the shared collectors
+        collectors = (issues, recommendations, applied_rules)
+        self._validate_pf(salary_breakdown, applicable_rules.pf_rules, *collectors)
+        self._validate_esi(salary_breakdown, applicable_rules.esi_rules, *collectors)
+        self._validate_professional_tax(salary_breakdown, applicable_rules.professional_tax_rules, *collectors)
+        has_violations = bool(issues)
+        # Only the TDS check raises judgement-call issues that need a manual review
+        needs_review = self._validate_tds(salary_breakdown, applicable_rules.tax_rules, *collectors)
+        
+        # Determine overall compliance status; a hard violation outranks a review flag
+        if has_violations:
+            compliance_status = ComplianceStatus.NON_COMPLIANT
+        elif needs_review:
             compliance_status = ComplianceStatus.REVIEW_REQUIRED
+        elif issues:
+            compliance_status = ComplianceStatus.NON_COMPLIANT
+        else:
+            compliance_status = ComplianceStatus.COMPLIANT
         
         # Calculate confidence score
         confidence_score = self._calculate_confidence_score(issues, applied_rules)
@@ -477,35 +794,31 @@ class ComplianceMapperAgent(BaseAgent):
             confidence_score=confidence_score
         )
         
-        logger.info(f"Compliance validation completed - Status: {compliance_status}, Issues: {len(issues)}")
+        logger.info("Compliance validation completed - Status: %s, Issues: %d", compliance_status, len(issues))
         return compliance_validation
     
-    def _validate_pf(self, salary_breakdown: SalaryBreakdown, pf_rules: Dict[str, Any]) -> Dict[str, List[str]]:
+    def _validate_pf(self, salary_breakdown: SalaryBreakdown, pf_rules: PFRules,
+                     issues: List[str], recommendations: List[str], applied_rules: List[str]):
         """Validate PF deduction"""
-        issues = []
-        recommendations = []
-        applied_rules = ["PF: 12% of basic salary, max ₹1800/month"]
+        applied_rules.append("PF: 12% of basic salary, max ₹1800/month")
         
-        calculated_pf = min(salary_breakdown.basic_salary * 0.12, 1800)
+        calculated_pf = min(salary_breakdown.basic_salary * PF_RATE, PF_CAP)
         actual_pf = salary_breakdown.deductions.pf
         
         if abs(calculated_pf - actual_pf) > 1.0:  # Allow ₹1 tolerance
             issues.append(f"PF calculation mismatch: Expected ₹{calculated_pf:.2f}, Got ₹{actual_pf:.2f}")
             recommendations.append("Recalculate PF as 12% of basic salary with ₹1800 monthly cap")
         
-        if salary_breakdown.basic_salary > 15000 and actual_pf != 1800:
+        if salary_breakdown.basic_salary > 15000 and actual_pf != PF_CAP:
             recommendations.append("Consider voluntary PF contribution above statutory limit")
-        
-        return {"issues": issues, "recommendations": recommendations, "applied_rules": applied_rules}
     
-    def _validate_esi(self, salary_breakdown: SalaryBreakdown, esi_rules: Dict[str, Any]) -> Dict[str, List[str]]:
+    def _validate_esi(self, salary_breakdown: SalaryBreakdown, esi_rules: ESIRules,
+                      issues: List[str], recommendations: List[str], applied_rules: List[str]):
         """Validate ESI deduction"""
-        issues = []
-        recommendations = []
-        applied_rules = ["ESI: 0.75% of gross salary for employees earning ≤ ₹21,000/month"]
+        applied_rules.append("ESI: 0.75% of gross salary for employees earning ≤ ₹21,000/month")
         
-        if salary_breakdown.gross_salary <= 21000:
-            calculated_esi = salary_breakdown.gross_salary * 0.0075
+        if salary_breakdown.gross_salary <= ESI_THRESHOLD:
+            calculated_esi = salary_breakdown.gross_salary * ESI_RATE
             actual_esi = salary_breakdown.deductions.esi
             
             if abs(calculated_esi - actual_esi) > 1.0:
@@ -515,30 +828,25 @@ class ComplianceMapperAgent(BaseAgent):
             if salary_breakdown.deductions.esi > 0:
                 issues.append("ESI deducted for employee earning > ₹21,000/month")
                 recommendations.append("Remove ESI deduction as employee exceeds salary limit")
-        
-        return {"issues": issues, "recommendations": recommendations, "applied_rules": applied_rules}
     
-    def _validate_professional_tax(self, salary_breakdown: SalaryBreakdown, pt_rules: Dict[str, Any]) -> Dict[str, List[str]]:
+    def _validate_professional_tax(self, salary_breakdown: SalaryBreakdown, pt_rules: ProfessionalTaxRules,
+                                   issues: List[str], recommendations: List[str], applied_rules: List[str]):
         """Validate Professional Tax deduction"""
-        issues = []
-        recommendations = []
-        state = pt_rules.get("state", "Karnataka")
-        applied_rules = [f"Professional Tax: {state} state rules applied"]
+        state = pt_rules.state
+        applied_rules.append(f"Professional Tax: {state} state rules applied")
         
-        expected_pt = pt_rules.get("monthly_amount", 0)
+        expected_pt = pt_rules.monthly_amount
         actual_pt = salary_breakdown.deductions.professional_tax
         
         if abs(expected_pt - actual_pt) > 5.0:  # Allow ₹5 tolerance
             issues.append(f"Professional Tax mismatch: Expected ₹{expected_pt:.2f}, Got ₹{actual_pt:.2f}")
             recommendations.append(f"Apply correct {state} professional tax rates")
-        
-        return {"issues": issues, "recommendations": recommendations, "applied_rules": applied_rules}
     
-    def _validate_tds(self, salary_breakdown: SalaryBreakdown, tax_rules: Dict[str, Any]) -> Dict[str, List[str]]:
-        """Validate TDS calculation"""
-        issues = []
-        recommendations = []
-        applied_rules = ["TDS: Calculated based on current income tax slabs with standard deduction"]
+    def _validate_tds(self, salary_breakdown: SalaryBreakdown, tax_rules: TaxRules,
+                      issues: List[str], recommendations: List[str], applied_rules: List[str]) -> bool:
+        """Validate TDS calculation; returns True when an issue needs manual review"""
+        needs_review = False
+        applied_rules.append("TDS: Calculated based on current income tax slabs with standard deduction")
         
         # This is a simplified validation - actual TDS depends on many factors
         if salary_breakdown.annual_gross > 300000 and salary_breakdown.deductions.tds == 0:
@@ -547,8 +855,9 @@ class ComplianceMapperAgent(BaseAgent):
         if salary_breakdown.deductions.tds > salary_breakdown.gross_salary * 0.3:
             issues.append("TDS appears unusually high - please verify calculation")
             recommendations.append("Check TDS calculation considering all exemptions and deductions")
+            needs_review = True
         
-        return {"issues": issues, "recommendations": recommendations, "applied_rules": applied_rules}
+        return needs_review
     
     def _calculate_confidence_score(self, issues: List[str], applied_rules: List[str]) -> float:
         """Calculate confidence score for compliance validation"""
@@ -564,13 +873,13 @@ class ComplianceMapperAgent(BaseAgent):
         
         return round(confidence, 2)
     
-    def _create_validated_deductions(self, salary_breakdown: SalaryBreakdown, applicable_rules: Dict[str, Any]) -> Deductions:
+    def _create_validated_deductions(self, salary_breakdown: SalaryBreakdown, applicable_rules: ApplicableRules) -> Deductions:
         """Create corrected deductions based on compliance rules"""
         
         # Calculate correct values
-        correct_pf = min(salary_breakdown.basic_salary * 0.12, 1800)
-        correct_esi = salary_breakdown.gross_salary * 0.0075 if salary_breakdown.gross_salary <= 21000 else 0
-        correct_pt = applicable_rules["professional_tax_rules"].get("monthly_amount", 0)
+        correct_pf = min(salary_breakdown.basic_salary * PF_RATE, PF_CAP)
+        correct_esi = salary_breakdown.gross_salary * ESI_RATE if salary_breakdown.gross_salary <= ESI_THRESHOLD else 0
+        correct_pt = applicable_rules.professional_tax_rules.monthly_amount
         
         return Deductions(
             pf=round(correct_pf, 2),
@@ -597,21 +906,11 @@ class AnomalyDetectorAgent(BaseAgent):
         
         anomalies = []
         
-        # Check for calculation anomalies
-        calc_anomalies = self._detect_calculation_anomalies(salary_data)
-        anomalies.extend(calc_anomalies)
-        
-        # Check for data inconsistencies
-        data_anomalies = self._detect_data_inconsistencies(contract_data, salary_data)
-        anomalies.extend(data_anomalies)
-        
-        # Check for compliance anomalies
-        compliance_anomalies = self._detect_compliance_anomalies(compliance_data)
-        anomalies.extend(compliance_anomalies)
-        
-        # Check for outlier values
-        outlier_anomalies = self._detect_outlier_values(salary_data)
-        anomalies.extend(outlier_anomalies)
+        # Each detector appends into the shared anomalies list
+        self._detect_calculation_anomalies(salary_data, anomalies)
+        self._detect_data_inconsistencies(contract_data, salary_data, anomalies)
+        self._detect_compliance_anomalies(compliance_data, anomalies)
+        self._detect_outlier_values(salary_data, anomalies)
         
         # Determine overall status
         overall_status = self._determine_overall_status(anomalies)
@@ -627,12 +926,11 @@ class AnomalyDetectorAgent(BaseAgent):
             review_notes=self._generate_review_notes(anomalies)
         )
         
-        logger.info(f"Anomaly detection completed - Found {len(anomalies)} anomalies, Status: {overall_status}")
+        logger.info("Anomaly detection completed - Found %d anomalies, Status: %s", len(anomalies), overall_status)
         return anomaly_detection
     
-    def _detect_calculation_anomalies(self, salary_data: SalaryBreakdown) -> List[Anomaly]:
+    def _detect_calculation_anomalies(self, salary_data: SalaryBreakdown, anomalies: List[Anomaly]):
         """Detect mathematical calculation errors"""
-        anomalies = []
         
         # Check if gross salary matches components
         calculated_gross = salary_data.basic_salary + salary_data.hra + salary_data.allowances
@@ -647,7 +945,7 @@ class AnomalyDetectorAgent(BaseAgent):
             ))
         
         # Check if net salary calculation is correct
-        total_deductions = sum(salary_data.deductions.dict().values())
+        total_deductions = salary_data.deductions.total
         calculated_net = salary_data.gross_salary - total_deductions
         if abs(calculated_net - salary_data.net_salary) > 1.0:  # ₹1 tolerance
             anomalies.append(Anomaly(
@@ -669,15 +967,11 @@ class AnomalyDetectorAgent(BaseAgent):
                 suggested_action="Review deductions - total deductions exceed gross salary",
                 confidence=1.0
             ))
-        
-        return anomalies
     
-    def _detect_data_inconsistencies(self, contract_data: ContractData, salary_data: SalaryBreakdown) -> List[Anomaly]:
+    def _detect_data_inconsistencies(self, contract_data: ContractData, salary_data: SalaryBreakdown, anomalies: List[Anomaly]):
         """Detect inconsistencies between contract and calculated data"""
-        anomalies = []
-        
         if not contract_data:
-            return anomalies
+            return
         
         # Check if contract gross matches calculated gross
         contract_gross = contract_data.salary_structure.gross
@@ -702,35 +996,47 @@ class AnomalyDetectorAgent(BaseAgent):
                 suggested_action="Verify basic salary interpretation from contract",
                 confidence=0.80
             ))
-        
-        return anomalies
     
-    def _detect_compliance_anomalies(self, compliance_data: ComplianceValidation) -> List[Anomaly]:
+    def _detect_compliance_anomalies(self, compliance_data: ComplianceValidation, anomalies: List[Anomaly]):
         """Convert compliance issues to anomalies"""
-        anomalies = []
-        
         if not compliance_data:
-            return anomalies
-        
-        if compliance_data.compliance_status == ComplianceStatus.NON_COMPLIANT:
-            for issue in compliance_data.issues:
-                anomalies.append(Anomaly(
+            return
+        
+        if compliance_data.compliance_status == ComplianceStatus.REVIEW_REQUIRED:
+            anomalies.extend([
+                Anomaly(
+                    type="compliance_review",
+                    description=f"Compliance check needs review: {issue}",
+                    severity=SeverityLevel.MEDIUM,
+                    affected_field="deductions",
+                    suggested_action="Manually verify the flagged deduction",
+                    confidence=0.75
+                )
+                for issue in compliance_data.issues
+            ])
+        elif compliance_data.compliance_status == ComplianceStatus.NON_COMPLIANT:
+            anomalies.extend([
+                Anomaly(
                     type="compliance_issue",
                     description=f"Compliance violation: {issue}",
                     severity=SeverityLevel.HIGH,
                     affected_field="deductions",
                     suggested_action="Apply correct compliance rules",
                     confidence=0.90
-                ))
-        
-        return anomalies
+                )
+                for issue in compliance_data.issues
+            ])
     
-    def _detect_outlier_values(self, salary_data: SalaryBreakdown) -> List[Anomaly]:
+    def _detect_outlier_values(self, salary_data: SalaryBreakdown, anomalies: List[Anomaly]):
         """Detect unusual or outlier salary values"""
-        anomalies = []
+        gross = salary_data.gross_salary
+        if not gross:
+            # Percentages of a zero gross are undefined; skip rather than raise ZeroDivisionError
+            return
+        inv_gross_pct = 100.0 / gross
         
         # Check for unusually high basic salary percentage
-        basic_percentage = (salary_data.basic_salary / salary_data.gross_salary) * 100
+        basic_percentage = salary_data.basic_salary * inv_gross_pct
         if basic_percentage > 70:
             anomalies.append(Anomaly(
                 type="data_inconsistency",
@@ -751,7 +1057,7 @@ class AnomalyDetectorAgent(BaseAgent):
             ))
         
         # Check for unusually high deductions
-        total_deduction_percentage = (sum(salary_data.deductions.dict().values()) / salary_data.gross_salary) * 100
+        total_deduction_percentage = salary_data.deductions.total * inv_gross_pct
         if total_deduction_percentage > 40:
             anomalies.append(Anomaly(
                 type="calculation_error",
@@ -761,20 +1067,18 @@ class AnomalyDetectorAgent(BaseAgent):
                 suggested_action="Review all deductions for accuracy",
                 confidence=0.80
             ))
-        
-        return anomalies
     
     def _determine_overall_status(self, anomalies: List[Anomaly]) -> AnomalyStatus:
         """Determine overall anomaly status"""
         if not anomalies:
             return AnomalyStatus.NORMAL
         
-        critical_count = sum(1 for a in anomalies if a.severity == SeverityLevel.CRITICAL)
-        high_count = sum(1 for a in anomalies if a.severity == SeverityLevel.HIGH)
-        
-        if critical_count > 0:
+        # One critical anomaly settles it, so stop at the first
+        if any(a.severity == SeverityLevel.CRITICAL for a in anomalies):
             return AnomalyStatus.CRITICAL
-        elif high_count > 2 or len(anomalies) > 5:
+        
+        high_count = Counter(a.severity for a in anomalies)[SeverityLevel.HIGH]
+        if high_count > 2 or len(anomalies) > 5:
             return AnomalyStatus.CRITICAL
         else:
             return AnomalyStatus.REVIEW_REQUIRED
@@ -793,17 +1097,82 @@ class AnomalyDetectorAgent(BaseAgent):
         if not anomalies:
             return "No anomalies detected. Payroll calculations appear correct."
         
-        notes = [f"Detected {len(anomalies)} anomalies requiring attention:"]
-        
-        for i, anomaly in enumerate(anomalies, 1):
-            notes.append(f"{i}. {anomaly.description} (Severity: {anomaly.severity})")
+        desc_lines = [f"{i}. {a.description} (Severity: {a.severity})" for i, a in enumerate(anomalies, 1)]
+        action_lines = [f"- {a.suggested_action}" for a in anomalies if a.suggested_action]
         
-        notes.append("\nRecommended actions:")
-        for anomaly in anomalies:
-            if anomaly.suggested_action:
-                notes.append(f"- {anomaly.suggested_action}")
-        
-        return "\n".join(notes)
+        return "\n".join([
+            f"Detected {len(anomalies)} anomalies requiring attention:",
+            *desc_lines,
+            "",
+            "Recommended actions:",
+            *action_lines,
+        ])
+
+@functools.lru_cache(maxsize=None)
+def _paystub_styles() -> Dict[str, Any]:
+    """Build the ReportLab paystub styles once per process, on first use"""
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import TableStyle
+    from reportlab.lib import colors
+    
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        spaceAfter=30,
+        alignment=1  # Center alignment
+    )
+    header_style = ParagraphStyle(
+        'CustomHeader',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceAfter=12
+    )
+    emp_table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+    salary_table_style = TableStyle([
+        # Header row
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        
+        # Data rows
+        ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
+        ('ALIGN', (3, 1), (3, -1), 'RIGHT'),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        
+        # Totals row
+        ('BACKGROUND', (0, 8), (-1, 8), colors.lightgrey),
+        ('FONTNAME', (0, 8), (-1, 8), 'Helvetica-Bold'),
+        
+        # Net salary row
+        ('BACKGROUND', (0, 10), (1, 10), colors.green),
+        ('TEXTCOLOR', (0, 10), (1, 10), colors.whitesmoke),
+        ('FONTNAME', (0, 10), (1, 10), 'Helvetica-Bold'),
+        
+        # Grid
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+    
+    return {
+        "normal": styles['Normal'],
+        "title": title_style,
+        "header": header_style,
+        "emp_table": emp_table_style,
+        "salary_table": salary_table_style,
+    }
 
 class PaystubGeneratorAgent(BaseAgent):
     """Agent 5: Generate professional paystubs and tax documents"""
@@ -814,58 +1183,69 @@ class PaystubGeneratorAgent(BaseAgent):
     def _process(self, data: Dict[str, Any]) -> PaystubData:
         """Generate paystub and related documents"""
         
+        paystub_data = self._build_paystub_data(data)
+        
+        # Generate PDF paystub and store its path
+        paystub_data.pdf_path = self._write_pdf_paystub(paystub_data)
+        
+        logger.info("Generated paystub for %s", paystub_data.employee_info.employee_name)
+        return paystub_data
+    
+    def process_batch(self, paystub_inputs: List[Dict[str, Any]], max_workers: Optional[int] = None) -> List[PaystubData]:
+        """Generate paystubs for many employees, rendering the PDFs in a process pool
+        
+        Each input has the same contract_data/salary_data/compliance_data keys as
+        _process. Workers write the PDFs to disk and send back only their paths.
+        """
+        paystubs = [self._build_paystub_data(data) for data in paystub_inputs]
+        
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            pdf_paths = executor.map(PaystubGeneratorAgent._write_pdf_paystub, paystubs)
+            for paystub_data, pdf_path in zip(paystubs, pdf_paths):
+                paystub_data.pdf_path = pdf_path
+        
+        logger.info("Generated %d paystubs", len(paystubs))
+        return paystubs
+    
+    def _build_paystub_data(self, data: Dict[str, Any]) -> PaystubData:
+        """Assemble the paystub model for one employee"""
+        
         contract_data = data.get("contract_data")
         salary_data = data.get("salary_data")
         compliance_data = data.get("compliance_data")
+        now = datetime.now()
         
-        # Create paystub data
-        paystub_data = PaystubData(
+        return PaystubData(
             employee_info=contract_data.employee_info,
             salary_breakdown=salary_data,
             compliance_info=compliance_data,
-            pay_period=datetime.now().strftime("%B %Y"),
-            generated_date=datetime.now(),
+            pay_period=now.strftime("%B %Y"),
+            generated_date=now,
             template_version="v1.0"
         )
-        
-        # Generate PDF paystub
-        pdf_buffer = self._generate_pdf_paystub(paystub_data)
-        
-        # Save PDF to temporary file and store path
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", prefix="paystub_") as tmp_file:
-            tmp_file.write(pdf_buffer.getvalue())
-            paystub_data.pdf_path = tmp_file.name
-        
-        logger.info(f"Generated paystub for {contract_data.employee_info.employee_name}")
-        return paystub_data
     
-    def _generate_pdf_paystub(self, paystub_data: PaystubData) -> BytesIO:
-        """Generate professional PDF paystub"""
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        
-        # Define styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=30,
-            alignment=1  # Center alignment
-        )
+    @classmethod
+    def _write_pdf_paystub(cls, paystub_data: PaystubData) -> str:
+        """Render the paystub PDF to a temporary file and return its path"""
+        pdf_path = os.path.join(tempfile.gettempdir(), f"paystub_{uuid4().hex}.pdf")
+        cls._generate_pdf_paystub(paystub_data, pdf_path)
+        return pdf_path
+    
+    @classmethod
+    def _generate_pdf_paystub(cls, paystub_data: PaystubData, output_path: str):
+        """Generate professional PDF paystub, written straight to output_path"""
+        from reportlab.lib.pagesizes import A4
+        from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
+        from reportlab.lib.units import inch
         
-        header_style = ParagraphStyle(
-            'CustomHeader',
-            parent=styles['Heading2'],
-            fontSize=14,
-            spaceAfter=12
-        )
+        styles = _paystub_styles()
+        doc = SimpleDocTemplate(output_path, pagesize=A4)
         
         # Build content
         story = []
         
         # Company header
-        story.append(Paragraph("COMPANY PAYSLIP", title_style))
+        story.append(Paragraph("COMPANY PAYSLIP", styles["title"]))
         story.append(Spacer(1, 20))
         
         # Employee information table
@@ -880,16 +1260,7 @@ class PaystubGeneratorAgent(BaseAgent):
         ]
         
         emp_table = Table(employee_data, colWidths=[2*inch, 3*inch])
-        emp_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
+        emp_table.setStyle(styles["emp_table"])
         
         story.append(emp_table)
         story.append(Spacer(1, 20))
@@ -898,70 +1269,52 @@ class PaystubGeneratorAgent(BaseAgent):
         salary = paystub_data.salary_breakdown
         deductions = salary.deductions
         
+        basic, hra, allowances, gross, net = (
+            f'{v:,.2f}' for v in (salary.basic_salary, salary.hra, salary.allowances, salary.gross_salary, salary.net_salary)
+        )
+        pf, esi, pt, tds, advance, loan, other, total_ded = (
+            f'{v:,.2f}' for v in (
+                deductions.pf, deductions.esi, deductions.professional_tax, deductions.tds,
+                deductions.advance, deductions.loan_deduction, deductions.other_deductions, deductions.total,
+            )
+        )
+        
         salary_data = [
             ['EARNINGS', 'AMOUNT (₹)', 'DEDUCTIONS', 'AMOUNT (₹)'],
-            ['Basic Salary', f'{salary.basic_salary:,.2f}', 'Provident Fund', f'{deductions.pf:,.2f}'],
-            ['House Rent Allowance', f'{salary.hra:,.2f}', 'ESI', f'{deductions.esi:,.2f}'],
-            ['Other Allowances', f'{salary.allowances:,.2f}', 'Professional Tax', f'{deductions.professional_tax:,.2f}'],
-            ['', '', 'TDS', f'{deductions.tds:,.2f}'],
-            ['', '', 'Advance', f'{deductions.advance:,.2f}'],
-            ['', '', 'Loan Deduction', f'{deductions.loan_deduction:,.2f}'],
-            ['', '', 'Other Deductions', f'{deductions.other_deductions:,.2f}'],
-            ['GROSS SALARY', f'{salary.gross_salary:,.2f}', 'TOTAL DEDUCTIONS', f'{sum(deductions.dict().values()):,.2f}'],
+            ['Basic Salary', basic, 'Provident Fund', pf],
+            ['House Rent Allowance', hra, 'ESI', esi],
+            ['Other Allowances', allowances, 'Professional Tax', pt],
+            ['', '', 'TDS', tds],
+            ['', '', 'Advance', advance],
+            ['', '', 'Loan Deduction', loan],
+            ['', '', 'Other Deductions', other],
+            ['GROSS SALARY', gross, 'TOTAL DEDUCTIONS', total_ded],
             ['', '', '', ''],
-            ['NET SALARY', f'{salary.net_salary:,.2f}', '', ''],
+            ['NET SALARY', net, '', ''],
         ]
         
         salary_table = Table(salary_data, colWidths=[2*inch, 1.5*inch, 2*inch, 1.5*inch])
-        salary_table.setStyle(TableStyle([
-            # Header row
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            
-            # Data rows
-            ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
-            ('ALIGN', (3, 1), (3, -1), 'RIGHT'),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            
-            # Totals row
-            ('BACKGROUND', (0, 8), (-1, 8), colors.lightgrey),
-            ('FONTNAME', (0, 8), (-1, 8), 'Helvetica-Bold'),
-            
-            # Net salary row
-            ('BACKGROUND', (0, 10), (1, 10), colors.green),
-            ('TEXTCOLOR', (0, 10), (1, 10), colors.whitesmoke),
-            ('FONTNAME', (0, 10), (1, 10), 'Helvetica-Bold'),
-            
-            # Grid
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
+        salary_table.setStyle(styles["salary_table"])
         
         story.append(salary_table)
         story.append(Spacer(1, 20))
         
         # Compliance information
         compliance = paystub_data.compliance_info
-        story.append(Paragraph("Compliance Status", header_style))
+        story.append(Paragraph("Compliance Status", styles["header"]))
         
         compliance_text = f"Status: {compliance.compliance_status}<br/>"
         if compliance.issues:
             compliance_text += f"Issues: {len(compliance.issues)} found<br/>"
         compliance_text += f"Confidence Score: {compliance.confidence_score}"
         
-        story.append(Paragraph(compliance_text, styles['Normal']))
+        story.append(Paragraph(compliance_text, styles["normal"]))
         story.append(Spacer(1, 20))
         
         # Footer
         footer_text = f"Generated on: {paystub_data.generated_date.strftime('%d %B %Y %H:%M:%S')}<br/>"
         footer_text += f"Template Version: {paystub_data.template_version}"
-        story.append(Paragraph(footer_text, styles['Normal']))
+        story.append(Paragraph(footer_text, styles["normal"]))
         
         # Build PDF
-        doc.build(story)
-        buffer.seek(0)
-        
-        return buffer
\ No newline at end of file
+        doc.build(story)
\ No newline at end of file
@@ -1,20 +1,30 @@
 import os
+import atexit
+import re
 import json
-import tempfile
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+import weakref
+import orjson
+import functools
+import numpy as np
+import tiktoken
 import streamlit as st
+from collections import OrderedDict
 from datetime import datetime
-from typing import TypedDict, Annotated, List, Dict, Any, Optional
-from PyPDF2 import PdfReader
-from openai import OpenAI
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Literal
+import fitz  # PyMuPDF
+import httpx
+from openai import OpenAI, AsyncOpenAI
 import logging
 from dotenv import load_dotenv
 
-# LangGraph imports (left as-is in case you want the agentic ReAct flow)
-from langgraph.prebuilt import create_react_agent
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_core.tools import tool
-from langchain_core.messages import SystemMessage, BaseMessage, HumanMessage, AIMessage
-from langchain_openai import ChatOpenAI
+from payroll_constants import PF_RATE, PF_CAP, ESI_RATE, ESI_THRESHOLD
+
+from langchain_core.tools import tool, StructuredTool
 
 # ---------------------------------------------------------
 # Logging & env
@@ -38,41 +48,105 @@ if not GEMINI_API_KEY:
 # OpenAI / Gemini client initialization
 # (keep your base_url if using google's OpenAI-compat endpoint)
 # ---------------------------------------------------------
+# One pooled HTTP/2 connection is reused across calls instead of a fresh TLS handshake each time
+_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
 client = OpenAI(
-    api_key=GEMINI_API_KEY,
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-)
-
-llm = ChatOpenAI(
     api_key=GEMINI_API_KEY,
     base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
-    model="gemini-2.0-flash-exp",
-    temperature=0.1
+    http_client=httpx.Client(http2=True, limits=_HTTP_LIMITS, timeout=30.0)
 )
+atexit.register(client.close)
+
+# httpx async connections belong to the event loop that opened them and every
+# asyncio.run() starts a new loop, so the async client is shared per loop
+_aclients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+def _aclient() -> AsyncOpenAI:
+    """The AsyncOpenAI client for the running loop; all concurrent calls in a run share its pool."""
+    loop = asyncio.get_running_loop()
+    aclient = _aclients.get(loop)
+    if aclient is None:
+        aclient = _aclients[loop] = AsyncOpenAI(
+            api_key=GEMINI_API_KEY,
+            base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
+            http_client=httpx.AsyncClient(http2=True, limits=_HTTP_LIMITS, timeout=60.0)
+        )
+    return aclient
+
+def _run_async(coro):
+    """asyncio.run() that closes the loop's shared AsyncOpenAI client before the loop goes away."""
+    async def runner():
+        try:
+            return await coro
+        finally:
+            aclient = _aclients.pop(asyncio.get_running_loop(), None)
+            if aclient is not None:
+                await aclient.close()
+    return asyncio.run(runner())
+
+# Prompt budget for contract text. cl100k_base is not Gemini's tokenizer, but it
+# tracks it closely enough to keep requests at a predictable size.
+CONTRACT_TOKEN_LIMIT = 4000
+# Pages past this many characters can't survive the token cut, so extraction
+# stops there (tokens average ~4 chars; the slack keeps the token cut exact)
+CONTRACT_EXTRACT_CHAR_LIMIT = CONTRACT_TOKEN_LIMIT * 6
+# What the LLM actually receives: employee details sit at the top and pay terms in
+# the first pages, so longer contracts are cut to the head plus the salary clause
+CONTRACT_CHAR_LIMIT = 8000
+_CONTRACT_HEAD_CHARS = 2000
+_SALARY_ANCHOR_RE = re.compile(r"(?i)\b(?:salary|remuneration|compensation|ctc)\b")
 
 # ---------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------
+@functools.lru_cache(maxsize=1)
+def _get_encoding() -> "tiktoken.Encoding":
+    return tiktoken.get_encoding("cl100k_base")
+
+def _truncate_to_tokens(text: str, limit: int = CONTRACT_TOKEN_LIMIT) -> str:
+    """Cut text to at most `limit` tokens, leaving short text untouched."""
+    enc = _get_encoding()
+    tokens = enc.encode(text, disallowed_special=())
+    if len(tokens) <= limit:
+        return text
+    return enc.decode(tokens[:limit])
+
+def _contract_window(text: str) -> str:
+    """Trim text to CONTRACT_CHAR_LIMIT, keeping the salary section if it starts past the cut."""
+    if len(text) <= CONTRACT_CHAR_LIMIT:
+        return text
+    match = _SALARY_ANCHOR_RE.search(text)
+    if match is None or match.end() <= CONTRACT_CHAR_LIMIT - _CONTRACT_HEAD_CHARS:
+        window = text[:CONTRACT_CHAR_LIMIT]
+    else:
+        start = max(match.start() - 200, _CONTRACT_HEAD_CHARS)
+        window = text[:_CONTRACT_HEAD_CHARS] + "\n...\n" + text[start:start + CONTRACT_CHAR_LIMIT - _CONTRACT_HEAD_CHARS]
+    logger.info("Contract text trimmed from %d to %d characters for the LLM", len(text), len(window))
+    return window
+
+def _contract_prompt_text(text: str) -> str:
+    """Contract text as sent to the LLM: the salary-relevant window, capped in tokens."""
+    return _truncate_to_tokens(_contract_window(text))
+
+# Leading fence (with optional language marker) and trailing fence, in one pass
+_FENCE_RE = re.compile(r"^```[\w-]*\s*|\s*```$")
+
 def _clean_codeblock(text: str) -> str:
     """Remove triple-backtick fences and optional language markers."""
-    if text.startswith("```"):
-        # remove leading fence + possible language
-        parts = text.split("\n")
-        # remove first line fence
-        parts = parts[1:]
-        # if last line is fence, drop it
-        if parts and parts[-1].strip().endswith("```"):
-            parts = parts[:-1]
-        return "\n".join(parts).strip()
-    return text.strip()
+    return _FENCE_RE.sub("", text.strip()).strip()
+
+def _json_dumps(obj: Any) -> str:
+    """orjson encoder returning str, for tool outputs and cache values."""
+    return orjson.dumps(obj).decode()
 
 def _safe_load_json(s: str) -> Optional[dict]:
     s = s.strip()
-    s = _clean_codeblock(s)
+    if s.startswith("```"):
+        s = _clean_codeblock(s)
     try:
-        return json.loads(s)
-    except Exception as e:
-        # Try some minor fixes (single quotes -> double)
+        return orjson.loads(s)
+    except orjson.JSONDecodeError as e:
+        # Try some minor fixes (single quotes -> double); orjson is strict, so use stdlib here
         try:
             return json.loads(s.replace("'", '"'))
         except Exception:
@@ -82,70 +156,437 @@ def _safe_load_json(s: str) -> Optional[dict]:
 # ---------------------------------------------------------
 # Tool: extract PDF text
 # ---------------------------------------------------------
-@tool
-def extract_pdf_text_tool(file_path: str) -> str:
-    """Extract text content from a PDF file for contract analysis."""
+# Async callers run extraction in worker threads (asyncio.to_thread) to keep the event loop
+# free for LLM I/O; MuPDF isn't thread-safe, so only one thread extracts at a time
+_fitz_lock = threading.Lock()
+
+def _extract_pdf_text(file_path: Optional[str] = None, pdf_bytes: Optional[bytes] = None) -> str:
+    """
+    Extract contract text from a PDF path or from in-memory bytes (uploads are
+    opened straight from memory, without a temp file). Errors come back as "Error: ...".
+    """
     try:
-        reader = PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
+        parts = []
+        total = 0
+        # Pages are read sequentially on purpose: PyMuPDF documents must not be
+        # shared across threads, and MuPDF's C extraction is fast enough that the
+        # early cut-off below saves more than page-level parallelism would
+        with _fitz_lock:
+            doc = fitz.open(file_path) if pdf_bytes is None else fitz.open(stream=pdf_bytes, filetype="pdf")
+            with doc:
+                for page in doc:
+                    page_text = page.get_text()
+                    if page_text:
+                        parts.append(page_text)
+                        total += len(page_text)
+                        if total >= CONTRACT_EXTRACT_CHAR_LIMIT:
+                            break
+        text = "\n".join(parts)
         logger.info(f"Successfully extracted {len(text)} characters from PDF")
         return text.strip()
     except Exception as e:
         logger.error(f"PDF extraction failed: {e}")
         return f"Error: {str(e)}"
 
+@tool
+def extract_pdf_text_tool(file_path: str) -> str:
+    """Extract text content from a PDF file for contract analysis."""
+    return _extract_pdf_text(file_path)
+
+# ---------------------------------------------------------
+# Rule-based parser for templated contracts (skips the LLM)
+# ---------------------------------------------------------
+_RX_AMOUNT = r"\s*[:\-]\s*(?:₹|rs\.?|inr)?\s*(\d[\d,]*(?:\.\d+)?)\b"  # starts with a digit, never a bare comma
+_RX_TEXT = r"\s*[:\-]\s*([^\n]+)"
+
+_RX_EMPLOYEE_FIELDS = {
+    "employee_name": re.compile(r"(?im)^\s*(?:employee\s+)?name" + _RX_TEXT),
+    "employee_id": re.compile(r"(?i)employee\s*(?:id|code|no\.?)\s*[:\-]\s*([A-Za-z0-9\-/]+)"),
+    "department": re.compile(r"(?im)^\s*department" + _RX_TEXT),
+    "designation": re.compile(r"(?im)^\s*(?:designation|position|job\s+title)" + _RX_TEXT),
+    "location": re.compile(r"(?im)^\s*(?:location|work\s+location|place\s+of\s+work)" + _RX_TEXT),
+}
+_RX_SALARY_FIELDS = {
+    "basic": re.compile(r"(?i)\bbasic(?:\s+salary|\s+pay)?\b" + _RX_AMOUNT),
+    "hra": re.compile(r"(?i)\b(?:hra|house\s+rent\s+allowance)\b" + _RX_AMOUNT),
+    "allowances": re.compile(r"(?i)\b(?:other|special|total)\s+allowances?\b" + _RX_AMOUNT),
+    "gross": re.compile(r"(?i)\bgross(?:\s+salary|\s+pay)?\b" + _RX_AMOUNT),
+}
+# Annual figures need the LLM's judgement to convert; don't guess here
+_RX_ANNUAL = re.compile(r"(?i)per\s+annum|\bannual|\bp\.\s?a\.|\bctc\b|\byearly\b")
+
+def _regex_parse(text: str) -> Optional[dict]:
+    """
+    Parse a "Basic: ₹X  HRA: ₹Y" style contract without the LLM. Returns the same
+    shape as parse_contract_data_tool, or None when the template isn't recognised
+    (basic plus HRA or gross must be present, and no annual amounts).
+    """
+    if _RX_ANNUAL.search(text):
+        return None
+    salary = {}
+    for field, pattern in _RX_SALARY_FIELDS.items():
+        match = pattern.search(text)
+        try:
+            salary[field] = float(match.group(1).replace(",", "")) if match else None
+        except ValueError:
+            return None  # unreadable amount: leave the contract to the LLM
+    if salary["basic"] is None or (salary["hra"] is None and salary["gross"] is None):
+        return None
+    parsed = {}
+    for field, pattern in _RX_EMPLOYEE_FIELDS.items():
+        match = pattern.search(text)
+        parsed[field] = match.group(1).strip() if match else None
+    parsed["salary_structure"] = salary
+    return parsed
+
 # ---------------------------------------------------------
 # Tool: parse contract data (LLM)
 # ---------------------------------------------------------
-@tool
-def parse_contract_data_tool(contract_text: str) -> str:
+class _InvalidLLMJSON(ValueError):
+    """LLM reply that is not JSON; raised (not returned) so it is never cached."""
+
+# The output shape lives in the response schema, so the prompt itself stays one or two sentences.
+# Static text always goes first (system prompt, then contract) so repeated calls share a prefix the
+# provider can cache implicitly; it is far below the minimum size for an explicit context cache.
+_PARSE_PROMPT = ("Extract the employee details and monthly salary structure from this employment contract. "
+                 "Use null for missing fields; if amounts are annual, divide by 12 and say so in 'notes'.")
+
+_NULLABLE_STRING = {"type": ["string", "null"]}
+_NULLABLE_NUMBER = {"type": ["number", "null"]}
+_CONTRACT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "employee_name": _NULLABLE_STRING,
+        "employee_id": _NULLABLE_STRING,
+        "department": _NULLABLE_STRING,
+        "designation": _NULLABLE_STRING,
+        "location": _NULLABLE_STRING,
+        "salary_structure": {
+            "type": "object",
+            "properties": {key: _NULLABLE_NUMBER for key in ("basic", "hra", "allowances", "gross")},
+            "required": ["basic", "hra", "allowances", "gross"],
+        },
+        "notes": _NULLABLE_STRING,
+    },
+    "required": ["employee_name", "employee_id", "department", "designation", "location", "salary_structure"],
+}
+_PARSE_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "contract", "schema": _CONTRACT_SCHEMA},
+}
+
+# LLM parses keyed on the (already truncated) contract text; shared by the sync
+# tool and the async pipeline, so it is a plain LRU dict rather than lru_cache
+_PARSE_CACHE_SIZE = 256
+_parse_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()  # text -> (created, parsed JSON)
+_parse_cache_lock = threading.Lock()
+
+# A parsed contract is ~150-300 tokens of JSON; a tight cap keeps scheduling and bad-reply retries cheap
+_PARSE_MAX_TOKENS = 400
+
+# Interactive uploads pay for the low-latency tier; bulk runs accept queueing for the cheaper one.
+# Opt-in (PAYROLL_SERVICE_TIERS=1): endpoints that don't know service_tier reject the request,
+# and a failed parse has no fallback, so the field is only sent when explicitly enabled.
+_SERVICE_TIERS = {"interactive": "priority", "bulk": "flex"}
+_SERVICE_TIERS_ENABLED = os.getenv("PAYROLL_SERVICE_TIERS", "").lower() in ("1", "true", "yes")
+
+def _parse_request(contract_text: str, service_tier: Optional[str] = None) -> Dict[str, Any]:
+    request = dict(
+        model="gemini-2.0-flash-exp",
+        messages=[
+            {"role": "system", "content": _PARSE_PROMPT},
+            {"role": "user", "content": f"Contract text: {contract_text}"}
+        ],
+        temperature=0.0,
+        max_tokens=_PARSE_MAX_TOKENS,
+        response_format=_PARSE_RESPONSE_FORMAT
+    )
+    if service_tier:
+        request["service_tier"] = service_tier
+    return request
+
+# Parses also persist in SQLite so re-processed contracts skip the LLM across restarts.
+# Keys hash the prompt with the text: changing the prompt invalidates old entries.
+# Entries hold employee data, so both layers expire them after _PARSE_DB_TTL and
+# expired rows are deleted from disk, not just skipped.
+_PARSE_DB_PATH = os.getenv("PAYROLL_PARSE_CACHE_DB", "parse_cache.sqlite3")
+_PARSE_DB_TTL = 86400  # seconds
+_PARSE_DB_PURGE_INTERVAL = 3600  # seconds between purges of expired rows
+_parse_db_purged_at = 0.0
+
+@functools.lru_cache(maxsize=None)
+def _parse_db() -> Optional[sqlite3.Connection]:
+    try:
+        conn = sqlite3.connect(_PARSE_DB_PATH, check_same_thread=False)  # used under _parse_cache_lock
+        conn.execute("CREATE TABLE IF NOT EXISTS parses (key TEXT PRIMARY KEY, parsed TEXT NOT NULL, created REAL NOT NULL)")
+        _purge_expired_parses(conn)
+        return conn
+    except sqlite3.Error as e:
+        logger.warning("Parse cache database unavailable, caching in memory only: %s", e)
+        return None
+
+def _purge_expired_parses(db: sqlite3.Connection):
+    global _parse_db_purged_at
+    now = time.time()
+    with db:
+        db.execute("DELETE FROM parses WHERE created <= ?", (now - _PARSE_DB_TTL,))
+    _parse_db_purged_at = now
+
+def _parse_db_key(contract_text: str) -> str:
+    return hashlib.sha256(f"{_PARSE_PROMPT}\n{contract_text}".encode("utf-8")).hexdigest()
+
+def _remember_in_memory(contract_text: str, created: float, parsed_json: str):
+    _parse_cache[contract_text] = (created, parsed_json)
+    _parse_cache.move_to_end(contract_text)
+    if len(_parse_cache) > _PARSE_CACHE_SIZE:
+        _parse_cache.popitem(last=False)
+
+def _cached_parse(contract_text: str) -> Optional[str]:
+    with _parse_cache_lock:
+        cached = _parse_cache.get(contract_text)
+        if cached is not None:
+            created, parsed_json = cached
+            if created > time.time() - _PARSE_DB_TTL:
+                _parse_cache.move_to_end(contract_text)
+                return parsed_json
+            del _parse_cache[contract_text]
+        db = _parse_db()
+        if db is None:
+            return None
+        try:
+            row = db.execute(
+                "SELECT created, parsed FROM parses WHERE key = ? AND created > ?",
+                (_parse_db_key(contract_text), time.time() - _PARSE_DB_TTL)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Parse cache lookup failed: %s", e)
+            return None
+        if row is None:
+            return None
+        _remember_in_memory(contract_text, row[0], row[1])
+        return row[1]
+
+def _remember_parse(contract_text: str, parsed: dict) -> str:
+    parsed_json = _json_dumps(parsed)
+    created = time.time()
+    with _parse_cache_lock:
+        _remember_in_memory(contract_text, created, parsed_json)
+        db = _parse_db()
+        if db is not None:
+            try:
+                with db:
+                    db.execute(
+                        "INSERT OR REPLACE INTO parses (key, parsed, created) VALUES (?, ?, ?)",
+                        (_parse_db_key(contract_text), parsed_json, created)
+                    )
+                if created - _parse_db_purged_at > _PARSE_DB_PURGE_INTERVAL:
+                    _purge_expired_parses(db)
+            except sqlite3.Error as e:
+                logger.warning("Could not persist parse: %s", e)
+    return parsed_json
+
+def _store_parse(contract_text: str, content: str) -> str:
+    """Validate the LLM reply and cache it; invalid JSON raises and is not cached."""
+    result = content.strip()
+    parsed = _safe_load_json(result)
+    if parsed is None:
+        raise _InvalidLLMJSON(result)
+    return _remember_parse(contract_text, parsed)
+
+def _parse_contract_cached(contract_text: str) -> str:
+    cached = _cached_parse(contract_text)
+    if cached is not None:
+        return cached
+    response = client.chat.completions.create(**_parse_request(contract_text))
+    return _store_parse(contract_text, response.choices[0].message.content)
+
+async def _aparse_contract_cached(contract_text: str, service_tier: Optional[str] = None) -> str:
+    cached = _cached_parse(contract_text)
+    if cached is not None:
+        return cached
+    response = await _aclient().chat.completions.create(**_parse_request(contract_text, service_tier))
+    return _store_parse(contract_text, response.choices[0].message.content)
+
+def _parse_error(e: Exception) -> str:
+    if isinstance(e, _InvalidLLMJSON):
+        logger.error("parse_contract_data_tool: LLM output not valid JSON")
+        return _json_dumps({"error": "LLM output not valid JSON", "raw": e.args[0]})
+    logger.error(f"Contract parsing failed: {e}")
+    return _json_dumps({"error": str(e)})
+
+def _parse_contract_data(contract_text: str) -> str:
     """
     Use LLM to extract structured contract fields.
     Return a JSON string matching the expected schema.
     """
     try:
-        prompt = """Extract employee salary details from this employment contract.
-Return ONLY a valid JSON object with this exact structure (fields may be null if not present):
-{
-  "employee_name": "string or null",
-  "employee_id": "string or null", 
-  "department": "string or null",
-  "designation": "string or null",
-  "location": "string or null",
-  "salary_structure": {
-    "basic": number or null,
-    "hra": number or null,
-    "allowances": number or null,
-    "gross": number or null
-  }
-}
-If a numeric field is present as an annual amount, convert it to monthly (divide by 12) and document that in a 'notes' field inside the top-level object.
-Respond with JSON only (no explanation)."""
-        response = client.chat.completions.create(
-            model="gemini-2.0-flash-exp",
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": f"Contract text: {contract_text[:15000]}"}  # cap length
-            ],
-            temperature=0.0,
-            max_tokens=1500
-        )
-        result = response.choices[0].message.content.strip()
-        result = _clean_codeblock(result)
-        # validate JSON
-        parsed = _safe_load_json(result)
-        if parsed is None:
-            logger.error("parse_contract_data_tool: LLM output not valid JSON")
-            return json.dumps({"error": "LLM output not valid JSON", "raw": result})
+        result = _parse_contract_cached(_contract_prompt_text(contract_text))
+        logger.info("Successfully parsed contract data")
+        return result
+    except Exception as e:
+        return _parse_error(e)
+
+async def _aparse_truncated(contract_text: str, service_tier: Optional[str] = None) -> str:
+    try:
+        result = await _aparse_contract_cached(contract_text, service_tier)
         logger.info("Successfully parsed contract data")
-        return json.dumps(parsed)
+        return result
     except Exception as e:
-        logger.error(f"Contract parsing failed: {e}")
-        return json.dumps({"error": str(e)})
+        return _parse_error(e)
+
+async def _aparse_contract_data_tool(contract_text: str) -> str:
+    return await _aparse_truncated(_contract_prompt_text(contract_text))
+
+# The only tool that does network I/O: invoke() uses the sync client, while
+# ainvoke() awaits AsyncOpenAI so concurrent callers don't block the event loop
+parse_contract_data_tool = StructuredTool.from_function(
+    func=_parse_contract_data,
+    coroutine=_aparse_contract_data_tool,
+    name="parse_contract_data_tool",
+)
+
+async def aparse_contract_data(contract_text: str, service_tier: Optional[str] = None) -> str:
+    """
+    Async counterpart of parse_contract_data_tool used by the pipeline; templated
+    contracts are handled by _regex_parse and never reach the LLM.
+    """
+    parsed = _regex_parse(contract_text)
+    if parsed is not None:
+        logger.info("Parsed contract data with the rule-based parser")
+        return _json_dumps(parsed)
+    return await _aparse_truncated(_contract_prompt_text(contract_text), service_tier)
+
+# Several contracts per request amortize the per-call overhead; kept small so
+# one bad reply only sends a few contracts back to the single-contract path
+_PARSE_BATCH_SIZE = 8
+# Upper bound on LLM requests in flight at once across a batch run
+_LLM_CONCURRENCY = 8
+_BATCH_PARSE_PROMPT = _PARSE_PROMPT + (" Contracts are separated by '---CONTRACT <n>---' lines; "
+                                        "return one object per contract in 'contracts', in order.")
+_BATCH_PARSE_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "contracts",
+        "schema": {
+            "type": "object",
+            "properties": {"contracts": {"type": "array", "items": _CONTRACT_SCHEMA}},
+            "required": ["contracts"],
+        },
+    },
+}
+
+async def _aparse_batch_request(contract_texts: List[str], service_tier: Optional[str] = None) -> List[str]:
+    """One LLM call for several (truncated, uncached) contracts."""
+    body = "\n\n".join(f"---CONTRACT {n}---\n{text}" for n, text in enumerate(contract_texts, 1))
+    response = await _aclient().chat.completions.create(
+        model="gemini-2.0-flash-exp",
+        messages=[
+            {"role": "system", "content": _BATCH_PARSE_PROMPT},
+            {"role": "user", "content": body}
+        ],
+        temperature=0.0,
+        max_tokens=_PARSE_MAX_TOKENS * len(contract_texts),
+        response_format=_BATCH_PARSE_RESPONSE_FORMAT,
+        **({"service_tier": service_tier} if service_tier else {})
+    )
+    reply = _safe_load_json(response.choices[0].message.content.strip())
+    items = reply.get("contracts") if isinstance(reply, dict) else None
+    if not isinstance(items, list) or len(items) != len(contract_texts) or not all(isinstance(i, dict) for i in items):
+        raise _InvalidLLMJSON("batch reply is not a 'contracts' array with one object per contract")
+    return [_remember_parse(text, item) for text, item in zip(contract_texts, items)]
+
+def _resolve_without_llm(contract_texts: List[str]) -> Tuple[List[Optional[str]], List[Optional[str]], List[int]]:
+    """Regex parser and parse cache first; returns (results, truncated texts, indexes still needing the LLM)."""
+    results: List[Optional[str]] = []
+    truncated: List[Optional[str]] = []
+    for text in contract_texts:
+        parsed = _regex_parse(text)
+        if parsed is not None:
+            results.append(_json_dumps(parsed))
+            truncated.append(None)
+        else:
+            truncated.append(_contract_prompt_text(text))
+            results.append(_cached_parse(truncated[-1]))
+    misses = [i for i, result in enumerate(results) if result is None]
+    return results, truncated, misses
+
+async def aparse_contracts_batch(contract_texts: List[str], service_tier: Optional[str] = None) -> List[str]:
+    """
+    Parse many contracts with as few LLM calls as possible. Returns one JSON string
+    per contract (parsed data or an error object), in input order.
+    """
+    results, truncated, misses = _resolve_without_llm(contract_texts)
+
+    # Created here rather than at module level: a semaphore is bound to the running loop
+    semaphore = asyncio.Semaphore(_LLM_CONCURRENCY)
+
+    async def parse_one(text: str) -> str:
+        async with semaphore:
+            return await _aparse_truncated(text, service_tier)
+
+    async def parse_chunk(texts: List[str]) -> List[str]:
+        if len(texts) > 1:
+            try:
+                async with semaphore:
+                    return await _aparse_batch_request(texts, service_tier)
+            except Exception as e:
+                logger.warning("Batch parse of %d contracts failed, parsing individually: %s", len(texts), e)
+        return await asyncio.gather(*(parse_one(text) for text in texts))
+
+    chunks = [misses[start:start + _PARSE_BATCH_SIZE] for start in range(0, len(misses), _PARSE_BATCH_SIZE)]
+    parsed_chunks = await asyncio.gather(*(parse_chunk([truncated[i] for i in chunk]) for chunk in chunks))
+    for chunk, parsed in zip(chunks, parsed_chunks):
+        for i, result in zip(chunk, parsed):
+            results[i] = result
+    return results
+
+_BATCH_JOB_DONE = ("completed", "failed", "expired", "cancelled")
+
+def _run_parse_batch_job(contract_texts: List[str], poll_interval: float) -> List[str]:
+    """
+    Parse (truncated, uncached) contracts through the provider's Batch API: half the
+    price and no per-minute rate limit, but results can take up to 24h. Blocks until done.
+    """
+    lines = [
+        orjson.dumps({"custom_id": str(n), "method": "POST", "url": "/v1/chat/completions", "body": _parse_request(text)})
+        for n, text in enumerate(contract_texts)
+    ]
+    batch_file = client.files.create(file=("payroll_batch.jsonl", b"\n".join(lines)), purpose="batch")
+    batch = client.batches.create(input_file_id=batch_file.id, endpoint="/v1/chat/completions", completion_window="24h")
+    logger.info("Submitted parse batch %s with %d contracts", batch.id, len(contract_texts))
+    while batch.status not in _BATCH_JOB_DONE:
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+    if batch.status != "completed":
+        raise RuntimeError(f"Parse batch {batch.id} ended with status {batch.status}")
+
+    results = [_json_dumps({"error": "Contract missing from batch output"})] * len(contract_texts)
+    for line in client.files.content(batch.output_file_id).content.splitlines():
+        if not line.strip():
+            continue
+        record = orjson.loads(line)
+        n = int(record["custom_id"])
+        try:
+            results[n] = _store_parse(contract_texts[n], record["response"]["body"]["choices"][0]["message"]["content"])
+        except Exception as e:
+            results[n] = _parse_error(e)
+    return results
+
+def parse_contracts_offline(contract_texts: List[str], poll_interval: float = 60.0) -> List[str]:
+    """
+    Same contract as aparse_contracts_batch, for non-interactive runs (e.g. month-end payroll):
+    whatever the regex parser and cache can't answer goes into one Batch API job.
+    """
+    results, truncated, misses = _resolve_without_llm(contract_texts)
+    if misses:
+        try:
+            parsed = _run_parse_batch_job([truncated[i] for i in misses], poll_interval)
+        except Exception as e:
+            logger.error("Batch API job failed: %s", e)
+            parsed = [_json_dumps({"error": f"Batch API job failed: {e}"})] * len(misses)
+        for i, result in zip(misses, parsed):
+            results[i] = result
+    return results
 
 # ---------------------------------------------------------
 # Deterministic salary calculation (local) - more reliable
@@ -160,166 +601,281 @@ def _as_monthly(value: Optional[float], assume_annual: bool = False) -> Optional
     except:
         return None
 
+def _compute_deductions(basic_m, gross_m):
+    """
+    Deduction arithmetic on monthly basic/gross, as numpy ufuncs so the same code
+    works for one employee (scalars) or a whole batch (arrays).
+    Returns unrounded (pf, esi, professional_tax, tds).
+    """
+    basic_m = np.asarray(basic_m, dtype=float)
+    gross_m = np.asarray(gross_m, dtype=float)
+    # PF: 12% of basic (cap per month 1800)
+    pf = np.minimum(PF_RATE * basic_m, PF_CAP)
+    # ESI: 0.75% of gross if gross <= 21,000
+    esi = np.where(gross_m <= ESI_THRESHOLD, ESI_RATE * gross_m, 0.0)
+    # Professional Tax: Rs.200/month if salary > 15,000 (simple rule; actual rates vary by state)
+    professional_tax = np.where(gross_m > 15000, 200.0, 0.0)
+    # TDS: Simple estimate — conservative 10% on annual taxable portion above 250,000, spread monthly
+    tds = np.maximum(0.0, gross_m * 12.0 - 250000.0) * 0.10 / 12.0
+    return pf, esi, professional_tax, tds
+
+def calculate_salary_breakdown_batch(basic_m, gross_m) -> Dict[str, np.ndarray]:
+    """
+    Batch counterpart of calculate_salary_breakdown_tool for monthly payroll runs:
+    one array element per employee, no JSON or LLM in the loop.
+    basic_m may contain NaN where basic is unknown (40% of gross is assumed, as in the tool).
+    """
+    gross_m = np.asarray(gross_m, dtype=float)
+    basic_m = np.asarray(basic_m, dtype=float)
+    basic_m = np.where(np.isnan(basic_m), 0.4 * gross_m, basic_m)
+
+    pf, esi, professional_tax, tds = np.round(_compute_deductions(basic_m, gross_m), 2)
+    total_deductions = pf + esi + professional_tax + tds
+    return {
+        "gross_salary": np.round(gross_m, 2),
+        "pf": pf,
+        "esi": esi,
+        "professional_tax": professional_tax,
+        "tds": tds,
+        "total_deductions": np.round(total_deductions, 2),
+        "net_salary": np.round(np.maximum(0.0, gross_m - total_deductions), 2),
+    }
+
+def compute_salary_breakdown(parsed: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Deterministic calculator for Indian payroll monthly values on the parsed
+    contract dict. Returns the breakdown, or {"error": ...} if gross can't be derived.
+    """
+    # salary_structure may be missing or partial
+    ss = parsed.get("salary_structure", {}) if isinstance(parsed, dict) else {}
+    # prefer provided gross, otherwise sum components
+    basic = ss.get("basic")
+    hra = ss.get("hra")
+    allowances = ss.get("allowances")
+    gross = ss.get("gross")
+
+    # Some contracts provide annual amounts; user prompt/LLM may have converted that.
+    # Assume the values are monthly if reasonable; if any value > 200000 treat as annual and divide by 12.
+    def to_monthly_if_needed(x):
+        if x is None:
+            return None
+        try:
+            v = float(x)
+            if v > 200000:  # heuristic: >2 lakh likely annual
+                return v / 12.0
+            return v
+        except:
+            return None
+
+    basic_m = to_monthly_if_needed(basic)
+    hra_m = to_monthly_if_needed(hra)
+    allowances_m = to_monthly_if_needed(allowances)
+    gross_m = to_monthly_if_needed(gross)
+
+    # If gross missing but components present, compute sum
+    if gross_m is None and any(v is not None for v in (basic_m, hra_m, allowances_m)):
+        gross_m = sum(v or 0.0 for v in (basic_m, hra_m, allowances_m))
+
+    if gross_m is None:
+        return {"error": "Insufficient salary data to compute gross salary"}
+
+    # Deductions; if basic is missing assume 40% of gross as basic (common heuristic)
+    if basic_m is None:
+        basic_m = 0.4 * gross_m
+    pf, esi, professional_tax, tds = np.round(_compute_deductions(basic_m, gross_m), 2).tolist()
+
+    deductions = {
+        "pf": pf,
+        "esi": esi,
+        "professional_tax": professional_tax,
+        "tds": tds
+    }
+
+    total_deductions = sum(deductions.values())
+    net_salary = round(max(0.0, gross_m - total_deductions), 2)
+
+    result = {
+        "gross_salary": round(gross_m, 2),
+        "deductions": deductions,
+        "total_deductions": round(total_deductions, 2),
+        "net_salary": net_salary,
+        "notes": "Estimates: PF cap=₹1800, ESI applicable if gross<=21000, professional tax simplified, TDS a rough estimate."
+    }
+    logger.info("Successfully calculated salary breakdown")
+    return result
+
 @tool
 def calculate_salary_breakdown_tool(contract_data: str) -> str:
     """
     Deterministic calculator for Indian payroll monthly values.
     Expects contract_data to be a JSON string matching parse output.
     """
+    return _calculate_salary_breakdown(contract_data)
+
+@functools.lru_cache(maxsize=256)
+def _calculate_salary_breakdown(contract_data: str) -> str:
+    """Pure function of its input string, so replays of the same contract hit the cache."""
     try:
         parsed = _safe_load_json(contract_data)
         if parsed is None:
-            return json.dumps({"error": "Invalid contract_data JSON"})
-
-        # salary_structure may be missing or partial
-        ss = parsed.get("salary_structure", {}) if isinstance(parsed, dict) else {}
-        # prefer provided gross, otherwise sum components
-        basic = ss.get("basic")
-        hra = ss.get("hra")
-        allowances = ss.get("allowances")
-        gross = ss.get("gross")
-
-        # Some contracts provide annual amounts; user prompt/LLM may have converted that.
-        # Assume the values are monthly if reasonable; if any value > 200000 treat as annual and divide by 12.
-        def to_monthly_if_needed(x):
-            if x is None:
-                return None
-            try:
-                v = float(x)
-                if v > 200000:  # heuristic: >2 lakh likely annual
-                    return v / 12.0
-                return v
-            except:
-                return None
-
-        basic_m = to_monthly_if_needed(basic)
-        hra_m = to_monthly_if_needed(hra)
-        allowances_m = to_monthly_if_needed(allowances)
-        gross_m = to_monthly_if_needed(gross)
-
-        # If gross missing but components present, compute sum
-        if gross_m is None and any(v is not None for v in (basic_m, hra_m, allowances_m)):
-            gross_m = sum(v or 0.0 for v in (basic_m, hra_m, allowances_m))
-
-        if gross_m is None:
-            return json.dumps({"error": "Insufficient salary data to compute gross salary"})
-
-        # Deductions
-        # PF: 12% of basic (cap per month 1800)
-        pf = 0.0
-        if basic_m is not None:
-            pf_calc = 0.12 * basic_m
-            pf = min(pf_calc, 1800.0)
-        else:
-            # if basic missing, try assume 40% of gross as basic (common heuristic) then compute PF
-            estimated_basic = 0.4 * gross_m
-            pf = min(0.12 * estimated_basic, 1800.0)
-
-        # ESI: 0.75% of gross if gross <= 21,000
-        esi = 0.0
-        if gross_m <= 21000:
-            esi = 0.0075 * gross_m
-
-        # Professional Tax: Rs.200/month if salary > 15,000 (simple rule; actual rates vary by state)
-        professional_tax = 200.0 if gross_m > 15000 else 0.0
-
-        # TDS: Simple estimate — compute annual gross and apply a conservative 10% on taxable portion above 250,000.
-        annual_gross = gross_m * 12.0
-        taxable = max(0.0, annual_gross - 250000.0)
-        tds_annual_est = taxable * 0.10  # simplified slab
-        tds = tds_annual_est / 12.0
-
-        deductions = {
-            "pf": round(pf, 2),
-            "esi": round(esi, 2),
-            "professional_tax": round(professional_tax, 2),
-            "tds": round(tds, 2)
-        }
-
-        total_deductions = sum(deductions.values())
-        net_salary = round(max(0.0, gross_m - total_deductions), 2)
-
-        result = {
-            "gross_salary": round(gross_m, 2),
-            "deductions": deductions,
-            "net_salary": net_salary,
-            "notes": "Estimates: PF cap=₹1800, ESI applicable if gross<=21000, professional tax simplified, TDS a rough estimate."
-        }
-        logger.info("Successfully calculated salary breakdown")
-        return json.dumps(result)
+            return _json_dumps({"error": "Invalid contract_data JSON"})
+        return _json_dumps(compute_salary_breakdown(parsed))
     except Exception as e:
         logger.error(f"Salary calculation failed: {e}")
-        return json.dumps({"error": str(e)})
+        return _json_dumps({"error": str(e)})
 
 # ---------------------------------------------------------
 # Deterministic compliance validation (local)
 # ---------------------------------------------------------
+_DEDUCTION_DEFAULTS = {"pf": 0.0, "esi": 0.0, "professional_tax": 0.0, "tds": 0.0}
+
+def check_compliance(sd: Dict[str, Any]) -> Dict[str, Any]:
+    """Check PF limits, ESI eligibility, professional tax applicability, and TDS reasonableness."""
+    gross = sd.get("gross_salary", 0) or 0
+    net = sd.get("net_salary", 0) or 0
+    deductions = {**_DEDUCTION_DEFAULTS, **sd.get("deductions", {})}
+    pf, esi, prof_tax, tds = deductions["pf"], deductions["esi"], deductions["professional_tax"], deductions["tds"]
+    issues = []
+    recs = []
+
+    # PF check: PF <= 1800
+    if pf > PF_CAP + 1e-6:
+        issues.append("PF exceeds statutory monthly cap of ₹1800.")
+        recs.append("Reduce PF to statutory cap calculation or verify basic salary amount.")
+
+    # ESI: check eligibility
+    if gross > ESI_THRESHOLD and esi > 0.0:
+        issues.append("ESI deducted even though gross > ₹21,000; ESI shouldn't apply.")
+        recs.append("Remove ESI for this employee or verify gross salary.")
+
+    if gross <= ESI_THRESHOLD and esi == 0.0:
+        # maybe ESI missing (but some employers may not enroll)
+        recs.append("Verify whether employee is enrolled for ESI if gross <= ₹21,000.")
+
+    # Professional tax: check simple rule used
+    if gross > 15000 and prof_tax < 200.0 - 1e-6:
+        issues.append("Professional tax appears too low (expected ≈ ₹200 for gross > 15,000 in this simplified check).")
+        recs.append("Verify state professional tax rules; rates differ by state.")
+
+    # TDS: check crude reasonableness: if monthly TDS > 0.2 * net salary -> suspicious
+    if net > 0 and tds > 0.2 * net:
+        issues.append("TDS is unusually high compared to net salary; re-check tax estimates.")
+        recs.append("Recompute TDS using exact tax slabs and exemptions for the employee (use Form 16-like computation).")
+
+    compliance = "COMPLIANT" if len(issues) == 0 else "NON_COMPLIANT"
+
+    validated = {
+        "pf": round(pf, 2),
+        "esi": round(esi, 2),
+        "professional_tax": round(prof_tax, 2),
+        "tds": round(tds, 2)
+    }
+
+    result = {
+        "compliance_status": compliance,
+        "issues": issues,
+        "validated_deductions": validated,
+        "recommendations": recs
+    }
+    logger.info("Compliance validation done: %s", compliance)
+    return result
+
 @tool
 def validate_compliance_tool(salary_data: str) -> str:
     """Check PF limits, ESI eligibility, professional tax applicability, and TDS reasonableness."""
     try:
         sd = _safe_load_json(salary_data)
         if sd is None:
-            return json.dumps({"error": "Invalid salary_data JSON"})
-
-        gross = sd.get("gross_salary", 0) or 0
-        deductions = sd.get("deductions", {})
-        issues = []
-        recs = []
-
-        # PF check: PF <= 1800
-        pf = deductions.get("pf", 0)
-        if pf > 1800.0 + 1e-6:
-            issues.append("PF exceeds statutory monthly cap of ₹1800.")
-            recs.append("Reduce PF to statutory cap calculation or verify basic salary amount.")
-
-        # ESI: check eligibility
-        esi = deductions.get("esi", 0)
-        if gross > 21000 and esi > 0.0:
-            issues.append("ESI deducted even though gross > ₹21,000; ESI shouldn't apply.")
-            recs.append("Remove ESI for this employee or verify gross salary.")
-
-        if gross <= 21000 and esi == 0.0:
-            # maybe ESI missing (but some employers may not enroll)
-            recs.append("Verify whether employee is enrolled for ESI if gross <= ₹21,000.")
-
-        # Professional tax: check simple rule used
-        prof_tax = deductions.get("professional_tax", 0)
-        if gross > 15000 and prof_tax < 200.0 - 1e-6:
-            issues.append("Professional tax appears too low (expected ≈ ₹200 for gross > 15,000 in this simplified check).")
-            recs.append("Verify state professional tax rules; rates differ by state.")
-
-        # TDS: check crude reasonableness: if monthly TDS > 0.2 * net salary -> suspicious
-        tds = deductions.get("tds", 0)
-        net = sd.get("net_salary", 0) or 0
-        if net > 0 and tds > 0.2 * net:
-            issues.append("TDS is unusually high compared to net salary; re-check tax estimates.")
-            recs.append("Recompute TDS using exact tax slabs and exemptions for the employee (use Form 16-like computation).")
-
-        compliance = "COMPLIANT" if len(issues) == 0 else "NON_COMPLIANT"
-
-        validated = {
-            "pf": round(pf, 2),
-            "esi": round(esi, 2),
-            "professional_tax": round(prof_tax, 2),
-            "tds": round(tds, 2)
-        }
-
-        result = {
-            "compliance_status": compliance,
-            "issues": issues,
-            "validated_deductions": validated,
-            "recommendations": recs
-        }
-        logger.info("Compliance validation done: %s", compliance)
-        return json.dumps(result)
+            return _json_dumps({"error": "Invalid salary_data JSON"})
+        return _json_dumps(check_compliance(sd))
     except Exception as e:
         logger.error(f"Compliance validation failed: {e}")
-        return json.dumps({"error": str(e)})
+        return _json_dumps({"error": str(e)})
 
 # ---------------------------------------------------------
 # Deterministic anomaly detection (local)
 # ---------------------------------------------------------
+def find_anomalies(contract: Dict[str, Any], salary: Dict[str, Any], compliance: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Check for negative numbers, mismatches, missing deductions, and big differences between computed vs provided gross.
+    """
+    anomalies = []
+    overall_status = "NORMAL"
+    confidence = 0.9
+
+    gross = salary.get("gross_salary", 0) or 0
+    deductions = salary.get("deductions", {})
+    # Check negative or zero gross
+    if gross <= 0:
+        anomalies.append({
+            "type": "calculation_error",
+            "description": "Gross salary is zero or negative.",
+            "severity": "HIGH",
+            "affected_field": "gross_salary"
+        })
+        overall_status = "CRITICAL"
+
+    # Check deduction sums (reuse the total computed by the salary tool when present)
+    total_deds = salary.get("total_deductions")
+    if total_deds is None:
+        total_deds = sum(deductions.values())
+    if total_deds < 0:
+        anomalies.append({
+            "type": "calculation_error",
+            "description": "Total deductions negative.",
+            "severity": "HIGH",
+            "affected_field": "deductions"
+        })
+        overall_status = "CRITICAL"
+
+    # Check mismatch between gross and provided components if any
+    ss = contract.get("salary_structure", {}) or {}
+    comps_sum = 0
+    present_components = False
+    for k in ("basic", "hra", "allowances"):
+        v = ss.get(k)
+        if v is not None:
+            present_components = True
+            try:
+                numeric = float(v)
+                # If contract gave annual amounts, this might be much larger; we attempt to normalize:
+                if numeric > 200000:
+                    numeric = numeric / 12.0
+                comps_sum += numeric
+            except:
+                pass
+
+    if present_components and comps_sum > 0:
+        diff_pct = abs(comps_sum - gross) / max(1.0, gross)
+        if diff_pct > 0.05:  # >5% mismatch
+            anomalies.append({
+                "type": "data_inconsistency",
+                "description": f"Sum of components (basic+hra+allowances = {comps_sum:.2f}) differs from gross ({gross:.2f}) by {diff_pct*100:.2f}%.",
+                "severity": "MEDIUM" if diff_pct <= 0.2 else "HIGH",
+                "affected_field": "gross vs components"
+            })
+            overall_status = "REVIEW_REQUIRED"
+
+    # Add compliance issues as anomalies if NON_COMPLIANT
+    if compliance.get("compliance_status") == "NON_COMPLIANT":
+        anomalies.append({
+            "type": "data_inconsistency",
+            "description": "Compliance validation flagged non-compliance: " + "; ".join(compliance.get("issues", [])),
+            "severity": "MEDIUM",
+            "affected_field": "compliance"
+        })
+        if overall_status != "CRITICAL":
+            overall_status = "REVIEW_REQUIRED"
+
+    result = {
+        "has_anomalies": len(anomalies) > 0,
+        "anomalies": anomalies,
+        "overall_status": overall_status,
+        "confidence_score": round(confidence, 2)
+    }
+    logger.info("Anomaly detection completed. Found %d anomalies", len(anomalies))
+    return result
+
 @tool
 def detect_anomalies_tool(combined_data: str) -> str:
     """
@@ -329,92 +885,14 @@ def detect_anomalies_tool(combined_data: str) -> str:
     try:
         cd = _safe_load_json(combined_data)
         if cd is None:
-            return json.dumps({"error": "Invalid combined_data JSON"})
-
-        contract = cd.get("contract", {})
-        salary = cd.get("salary", {})
-        compliance = cd.get("compliance", {})
-
-        anomalies = []
-        overall_status = "NORMAL"
-        confidence = 0.9
-
-        gross = salary.get("gross_salary", 0) or 0
-        deductions = salary.get("deductions", {})
-        # Check negative or zero gross
-        if gross <= 0:
-            anomalies.append({
-                "type": "calculation_error",
-                "description": "Gross salary is zero or negative.",
-                "severity": "HIGH",
-                "affected_field": "gross_salary"
-            })
-            overall_status = "CRITICAL"
-
-        # Check deduction sums
-        total_deds = sum(deductions.values())
-        if total_deds < 0:
-            anomalies.append({
-                "type": "calculation_error",
-                "description": "Total deductions negative.",
-                "severity": "HIGH",
-                "affected_field": "deductions"
-            })
-            overall_status = "CRITICAL"
-
-        # Check mismatch between gross and provided components if any
-        ss = contract.get("salary_structure", {}) or {}
-        comps_sum = 0
-        present_components = False
-        for k in ("basic", "hra", "allowances"):
-            v = ss.get(k)
-            if v is not None:
-                present_components = True
-                try:
-                    numeric = float(v)
-                    # If contract gave annual amounts, this might be much larger; we attempt to normalize:
-                    if numeric > 200000:
-                        numeric = numeric / 12.0
-                    comps_sum += numeric
-                except:
-                    pass
-
-        if present_components and comps_sum > 0:
-            diff_pct = abs(comps_sum - gross) / max(1.0, gross)
-            if diff_pct > 0.05:  # >5% mismatch
-                anomalies.append({
-                    "type": "data_inconsistency",
-                    "description": f"Sum of components (basic+hra+allowances = {comps_sum:.2f}) differs from gross ({gross:.2f}) by {diff_pct*100:.2f}%.",
-                    "severity": "MEDIUM" if diff_pct <= 0.2 else "HIGH",
-                    "affected_field": "gross vs components"
-                })
-                overall_status = "REVIEW_REQUIRED"
-
-        # Add compliance issues as anomalies if NON_COMPLIANT
-        if compliance.get("compliance_status") == "NON_COMPLIANT":
-            anomalies.append({
-                "type": "data_inconsistency",
-                "description": "Compliance validation flagged non-compliance: " + "; ".join(compliance.get("issues", [])),
-                "severity": "MEDIUM",
-                "affected_field": "compliance"
-            })
-            if overall_status != "CRITICAL":
-                overall_status = "REVIEW_REQUIRED"
-
-        result = {
-            "has_anomalies": len(anomalies) > 0,
-            "anomalies": anomalies,
-            "overall_status": overall_status,
-            "confidence_score": round(confidence, 2)
-        }
-        logger.info("Anomaly detection completed. Found %d anomalies", len(anomalies))
-        return json.dumps(result)
+            return _json_dumps({"error": "Invalid combined_data JSON"})
+        return _json_dumps(find_anomalies(cd.get("contract", {}), cd.get("salary", {}), cd.get("compliance", {})))
     except Exception as e:
         logger.error(f"Anomaly detection failed: {e}")
-        return json.dumps({"error": str(e)})
+        return _json_dumps({"error": str(e)})
 
 # ---------------------------------------------------------
-# Tools list (same as before)
+# Tools list (LangChain wrappers around the pipeline functions)
 # ---------------------------------------------------------
 tools = [
     extract_pdf_text_tool,
@@ -424,190 +902,279 @@ tools = [
     detect_anomalies_tool
 ]
 
-# ---------------------------------------------------------
-# System prompt (kept for LangGraph agent)
-# ---------------------------------------------------------
-system_prompt = SystemMessage(content="""You are a payroll agent that uses tools for each step:
-1) extract_pdf_text_tool
-2) parse_contract_data_tool
-3) calculate_salary_breakdown_tool
-4) validate_compliance_tool
-5) detect_anomalies_tool
-
-Follow that sequence. Return a single JSON output at the end with keys:
-{
-  "success": boolean,
-  "contract_data": {},
-  "salary_data": {},
-  "compliance_data": {},
-  "anomalies_data": {},
-  "errors": []
-}
-""")
-
 # ---------------------------------------------------------
 # Deterministic pipeline class (recommended to call from Streamlit)
 # ---------------------------------------------------------
+def _new_output() -> Dict[str, Any]:
+    return {
+        "success": False,
+        "contract_data": None,
+        "salary_data": None,
+        "compliance_data": None,
+        "anomalies_data": None,
+        "errors": []
+    }
+
+# Successful pipeline results keyed by SHA-256 of the PDF bytes, so retries and
+# re-uploads of the same contract skip extraction and the LLM entirely
+_PIPELINE_CACHE_SIZE = 64
+_pipeline_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_pipeline_cache_lock = threading.Lock()
+
+def _read_pdf_bytes(contract_path: str) -> bytes:
+    try:
+        with open(contract_path, "rb") as f:
+            return f.read()
+    except OSError as e:
+        logger.error("Could not read %s: %s", contract_path, e)
+        return b""  # extraction then reports the unusable file
+
+def _cached_pipeline_result(pdf_key: str) -> Optional[Dict[str, Any]]:
+    with _pipeline_cache_lock:
+        cached = _pipeline_cache.get(pdf_key)
+        if cached is not None:
+            _pipeline_cache.move_to_end(pdf_key)
+    if cached is None:
+        return None
+    logger.info("Pipeline cache hit for %s", pdf_key[:12])
+    return orjson.loads(cached)  # fresh objects, callers may mutate them
+
+def _store_pipeline_result(pdf_key: str, output: Dict[str, Any]):
+    if not output["success"]:
+        return
+    with _pipeline_cache_lock:
+        _pipeline_cache[pdf_key] = orjson.dumps(output)
+        if len(_pipeline_cache) > _PIPELINE_CACHE_SIZE:
+            _pipeline_cache.popitem(last=False)
+
 class PayrollAgenticAI:
-    """Pure Agentic AI container. Provide a deterministic pipeline runner and keep agentic graph for optional use."""
-    def __init__(self):
-        memory = MemorySaver()
+    """Runs the fixed extract -> parse -> salary -> compliance -> anomalies pipeline."""
+    def __init__(self, mode: Literal["interactive", "bulk"] = "interactive"):
+        # Picks the provider service tier for every LLM parse this instance makes (when enabled)
+        self.service_tier = _SERVICE_TIERS[mode] if _SERVICE_TIERS_ENABLED else None
+
+    def process_contract_pipeline(self, contract_path: str) -> Dict[str, Any]:
+        """Synchronous entry point (Streamlit callbacks); runs the async pipeline to completion."""
+        return _run_async(self.aprocess_contract_pipeline(contract_path))
+
+    def process_contract_bytes(self, pdf_bytes: bytes) -> Dict[str, Any]:
+        """Synchronous entry point for an in-memory PDF, e.g. a Streamlit upload."""
+        return _run_async(self.aprocess_contract_bytes(pdf_bytes))
+
+    def iter_contract_bytes(self, pdf_bytes: bytes) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Same pipeline as process_contract_bytes, but yields (stage, output) after every stage so a
+        UI can show progress while the LLM parse is still running. The last item is ("done", output).
+        """
+        pdf_key = hashlib.sha256(pdf_bytes).hexdigest()
+        cached = _cached_pipeline_result(pdf_key)
+        if cached is not None:
+            yield "done", cached
+            return
+
+        output = _new_output()
+        text = self._extract_text(pdf_bytes, output)
+        if text is not None:
+            yield "text_extracted", output
+            for stage in self._finish_stages(output, _run_async(aparse_contract_data(text, self.service_tier))):
+                yield stage, output
+        _store_pipeline_result(pdf_key, output)
+        yield "done", output
+
+    async def aprocess_contract_pipeline(self, contract_path: str) -> Dict[str, Any]:
+        return await self.aprocess_contract_bytes(_read_pdf_bytes(contract_path))
+
+    async def aprocess_contract_bytes(self, pdf_bytes: bytes) -> Dict[str, Any]:
+        """Run the pipeline, reusing the stored result when the same PDF was processed before."""
+        pdf_key = hashlib.sha256(pdf_bytes).hexdigest()
+        cached = _cached_pipeline_result(pdf_key)
+        if cached is not None:
+            return cached
+
+        output = _new_output()
+        text = await asyncio.to_thread(self._extract_text, pdf_bytes, output)
+        if text is not None:
+            output = self._finish_pipeline(output, await aparse_contract_data(text, self.service_tier))
+        _store_pipeline_result(pdf_key, output)
+        return output
+
+    def process_contracts_batch(self, contract_paths: List[str]) -> List[Dict[str, Any]]:
+        """Synchronous entry point for several contracts; one result per path, in order."""
+        return _run_async(self.aprocess_contracts_batch(contract_paths))
+
+    def process_contract_bytes_batch(self, pdfs: List[bytes]) -> List[Dict[str, Any]]:
+        """Synchronous entry point for several in-memory PDFs; one result per PDF, in order."""
+        return _run_async(self.aprocess_contract_bytes_batch(pdfs))
+
+    async def aprocess_contracts_batch(self, contract_paths: List[str]) -> List[Dict[str, Any]]:
+        return await self.aprocess_contract_bytes_batch([_read_pdf_bytes(path) for path in contract_paths])
+
+    async def aprocess_contract_bytes_batch(self, pdfs: List[bytes]) -> List[Dict[str, Any]]:
+        """
+        Like aprocess_contract_bytes for many PDFs, but the uncached contracts are
+        parsed together (see aparse_contracts_batch) instead of one LLM call each.
+        """
+        pdf_keys, results, pending = await asyncio.to_thread(self._extract_batch, pdfs)
+        parsed_json_strings = await aparse_contracts_batch([text for _, _, text in pending], self.service_tier)
+        return self._finish_batch(pdf_keys, results, pending, parsed_json_strings)
+
+    def process_contracts_offline(self, contract_paths: List[str], poll_interval: float = 60.0) -> List[Dict[str, Any]]:
+        """
+        Bulk variant for non-interactive runs: LLM parsing goes through the Batch API
+        (see parse_contracts_offline), so this can block for hours. Interactive uploads
+        should keep using process_contract_bytes / process_contract_bytes_batch.
+        """
+        pdf_keys, results, pending = self._extract_batch([_read_pdf_bytes(path) for path in contract_paths])
+        parsed_json_strings = parse_contracts_offline([text for _, _, text in pending], poll_interval)
+        return self._finish_batch(pdf_keys, results, pending, parsed_json_strings)
+
+    def _extract_batch(self, pdfs: List[bytes]):
+        """Cache lookups and step 1 for a batch; pending holds (index, output, text) still needing a parse."""
+        pdf_keys = [hashlib.sha256(pdf_bytes).hexdigest() for pdf_bytes in pdfs]
+        results: List[Optional[Dict[str, Any]]] = [_cached_pipeline_result(key) for key in pdf_keys]
+
+        pending = []
+        for i, pdf_bytes in enumerate(pdfs):
+            if results[i] is not None:
+                continue
+            output = _new_output()
+            text = self._extract_text(pdf_bytes, output)
+            if text is None:
+                results[i] = output
+            else:
+                pending.append((i, output, text))
+        return pdf_keys, results, pending
+
+    def _finish_batch(self, pdf_keys, results, pending, parsed_json_strings) -> List[Dict[str, Any]]:
+        for (i, output, _), parsed_json_string in zip(pending, parsed_json_strings):
+            results[i] = self._finish_pipeline(output, parsed_json_string)
+            _store_pipeline_result(pdf_keys[i], results[i])
+        return results
+
+    def _extract_text(self, pdf_bytes: bytes, output: Dict[str, Any]) -> Optional[str]:
+        """Step 1; records the failure in output and returns None if there is no usable text."""
         try:
-            self.graph = create_react_agent(
-                llm,
-                tools,
-                state_modifier=system_prompt,
-                checkpointer=memory
-            )
+            text = _extract_pdf_text(pdf_bytes=pdf_bytes)
         except Exception as e:
-            logger.warning("Failed to create ReAct agent (LangGraph) — continuing with deterministic pipeline. Error: %s", e)
-            self.graph = None
-        self.thread_id = "payroll_thread_1"
+            logger.exception("Workflow execution failed")
+            output["errors"].append(str(e))
+            return None
+        if text.startswith("Error:") or text.strip() == "":
+            output["errors"].append(f"extract_pdf_text_tool failed: {text}")
+            return None
+        return text
 
-    def process_contract_pipeline(self, contract_path: str) -> Dict[str, Any]:
+    def _finish_pipeline(self, output: Dict[str, Any], parsed_json_string: str) -> Dict[str, Any]:
         """
-        Deterministic sequential pipeline calling the tools directly.
+        Deterministic sequential pipeline calling the tools directly, from the parse result on.
         This is recommended for predictable results (what Streamlit should call).
+        Only step 2 talks to the LLM (awaited via AsyncOpenAI by the callers); steps 3-5 call the
+        plain dict functions behind the tools, so nothing is re-encoded as JSON between stages.
         """
-        errors = []
-        output = {
-            "success": False,
-            "contract_data": None,
-            "salary_data": None,
-            "compliance_data": None,
-            "anomalies_data": None,
-            "errors": []
-        }
+        for _ in self._finish_stages(output, parsed_json_string):
+            pass
+        return output
+
+    def _finish_stages(self, output: Dict[str, Any], parsed_json_string: str) -> Iterator[str]:
+        """Fill in output stage by stage, yielding each output key as soon as it is set."""
+        errors = output["errors"]
         try:
-            # 1) extract text
-            text = extract_pdf_text_tool(contract_path)
-            if text.startswith("Error:") or (isinstance(text, str) and text.strip() == ""):
-                errors.append(f"extract_pdf_text_tool failed: {text}")
-                output["errors"] = errors
-                return output
             # 2) parse contract via LLM tool (returns JSON string or error JSON)
-            parsed_json_string = parse_contract_data_tool(text)
             parsed = _safe_load_json(parsed_json_string)
             if parsed is None or parsed.get("error"):
                 errors.append(f"parse_contract_data_tool failed or invalid JSON: {parsed_json_string}")
-                output["errors"] = errors
                 output["contract_data"] = parsed_json_string
-                return output
+                return
             output["contract_data"] = parsed
+            yield "contract_data"
 
             # 3) calculate salary deterministically
-            salary_json_str = calculate_salary_breakdown_tool(json.dumps(parsed))
-            salary = _safe_load_json(salary_json_str)
-            if salary is None or salary.get("error"):
-                errors.append(f"calculate_salary_breakdown_tool failed: {salary_json_str}")
-                output["errors"] = errors
-                output["salary_data"] = salary_json_str
-                return output
+            salary = compute_salary_breakdown(parsed)
+            if salary.get("error"):
+                errors.append(f"calculate_salary_breakdown_tool failed: {salary['error']}")
+                output["salary_data"] = salary
+                return
             output["salary_data"] = salary
+            yield "salary_data"
 
             # 4) compliance
-            compliance_str = validate_compliance_tool(json.dumps(salary))
-            compliance = _safe_load_json(compliance_str)
-            if compliance is None or compliance.get("error"):
-                errors.append(f"validate_compliance_tool failed: {compliance_str}")
-                output["errors"] = errors
-                output["compliance_data"] = compliance_str
-                return output
+            compliance = check_compliance(salary)
             output["compliance_data"] = compliance
+            yield "compliance_data"
 
             # 5) anomalies
-            combined = json.dumps({
-                "contract": parsed,
-                "salary": salary,
-                "compliance": compliance
-            })
-            anomalies_str = detect_anomalies_tool(combined)
-            anomalies = _safe_load_json(anomalies_str)
-            if anomalies is None or anomalies.get("error"):
-                errors.append(f"detect_anomalies_tool failed: {anomalies_str}")
-                output["errors"] = errors
-                output["anomalies_data"] = anomalies_str
-                return output
-            output["anomalies_data"] = anomalies
-
+            output["anomalies_data"] = find_anomalies(parsed, salary, compliance)
             output["success"] = len(errors) == 0
-            output["errors"] = errors
-            return output
+            yield "anomalies_data"
 
         except Exception as e:
             logger.exception("Workflow execution failed")
-            output["errors"].append(str(e))
-            return output
-
-    def process_contract_with_agent(self, contract_path: str) -> Dict[str, Any]:
-        """
-        Optional: invoke the LangGraph agentic ReAct flow. Not recommended as the primary
-        method for deterministic payroll math. Kept for experiments only.
-        """
-        if not self.graph:
-            return {"success": False, "errors": ["Agent not initialized"], "messages": []}
-        try:
-            config = {"configurable": {"thread_id": self.thread_id}}
-            input_message = HumanMessage(content=f"Process the employment contract at: {contract_path}")
-            final_state = self.graph.invoke({"messages": [input_message]}, config)
-            messages = final_state.get("messages", [])
-            last_message = messages[-1] if messages else None
-            # Expect last_message.content to be the JSON result
-            if isinstance(last_message, AIMessage):
-                try:
-                    result = json.loads(last_message.content)
-                    result["messages"] = [msg.content for msg in messages if isinstance(msg, (HumanMessage, AIMessage))]
-                    return result
-                except Exception as e:
-                    return {"success": False, "errors": [f"Failed to parse final output: {e}"], "messages": [msg.content for msg in messages]}
-            else:
-                return {"success": False, "errors": ["Agent did not return an AI message"], "messages": [msg.content for msg in messages]}
-        except Exception as e:
-            logger.exception("Agentic execution failed")
-            return {"success": False, "errors": [str(e)], "messages": []}
+            errors.append(str(e))
 
 # ---------------------------------------------------------
 # Streamlit integration (call deterministic pipeline)
 # ---------------------------------------------------------
+@st.cache_resource(show_spinner=False)
+def get_payroll_ai() -> PayrollAgenticAI:
+    """Build the payroll AI once and share it across reruns"""
+    return PayrollAgenticAI(mode="interactive")
+
+STAGE_LABELS = {
+    "text_extracted": "Text extraction",
+    "contract_data": "Contract parsing",
+    "salary_data": "Salary calculation",
+    "compliance_data": "Compliance validation",
+    "anomalies_data": "Anomaly detection",
+}
+
+
 def main():
     st.set_page_config(page_title="AgenticAI Payroll System", page_icon="🤖", layout="wide")
     st.title("🤖 AgenticAI Payroll Processing System")
     st.markdown("**Deterministic payroll pipeline (LLM for parsing only)**")
 
-    if 'agentic_ai' not in st.session_state:
-        st.session_state.agentic_ai = PayrollAgenticAI()
-        st.session_state.processing_result = None
-
-    contract_file = st.file_uploader("Upload Employee Contract PDF", type=["pdf"])
-    if st.button("🚀 Process (Deterministic Pipeline)", disabled=not contract_file):
-        if contract_file:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                tmp.write(contract_file.read())
-                path = tmp.name
-            with st.spinner("Processing..."):
-                result = st.session_state.agentic_ai.process_contract_pipeline(path)
-                st.session_state.processing_result = result
-            try:
-                os.unlink(path)
-            except:
-                pass
-
-    if st.session_state.processing_result:
-        result = st.session_state.processing_result
-        if result.get("success"):
-            st.success("✅ Processing completed successfully")
+    st.session_state.setdefault("processing_results", [])
+
+    contract_files = st.file_uploader("Upload Employee Contract PDFs", type=["pdf"], accept_multiple_files=True)
+    if st.button("🚀 Process (Deterministic Pipeline)", disabled=not contract_files):
+        # Uploads are parsed straight from memory; no temp file round-trip
+        pdfs = [contract_file.getvalue() for contract_file in contract_files]
+        payroll_ai = get_payroll_ai()
+        if len(pdfs) == 1:
+            # Single contract: report each stage as it finishes instead of one long spinner
+            with st.status("Processing contract...", expanded=True) as status:
+                for stage, result in payroll_ai.iter_contract_bytes(pdfs[0]):
+                    if stage in STAGE_LABELS:
+                        status.write(f"✅ {STAGE_LABELS[stage]}")
+                        status.update(label=f"{STAGE_LABELS[stage]} done...")
+                status.update(
+                    label="Processing complete" if result.get("success") else "Processing finished with errors",
+                    state="complete" if result.get("success") else "error",
+                    expanded=False,
+                )
+            results = [result]
         else:
-            st.error(f"❌ Processing finished with errors: {result.get('errors', [])}")
+            with st.spinner(f"Processing {len(pdfs)} contract(s)..."):
+                results = payroll_ai.process_contract_bytes_batch(pdfs)
+        st.session_state.processing_results = [(f.name, r) for f, r in zip(contract_files, results)]
+
+    if st.session_state.processing_results:
+        results = st.session_state.processing_results
+        for name, result in results:
+            if result.get("success"):
+                st.success(f"✅ {name}: processing completed successfully")
+            else:
+                st.error(f"❌ {name}: processing finished with errors: {result.get('errors', [])}")
 
-        with st.expander("Result JSON", expanded=True):
-            st.json(result)
+            with st.expander(f"Result JSON — {name}", expanded=len(results) == 1):
+                st.json(result)
 
     else:
-        st.info("Upload a contract PDF and press 'Process' to run the deterministic pipeline.")
+        st.info("Upload one or more contract PDFs and press 'Process' to run the deterministic pipeline.")
         st.markdown("""
         **Notes**
         - Parsing (structure extraction) still uses the LLM. Salary math, compliance checks and anomalies detection are deterministic Python logic (more reliable).
-        - The deterministic pipeline is recommended for production. The LangGraph agentic ReAct flow is available for experimentation but not required.
+        - Each contract runs through a fixed five-step pipeline; there is no agent deciding which tool to call next.
         """)
 
 if __name__ == "__main__":
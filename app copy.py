@@ -1,10 +1,10 @@
 # app.py
 import os
 import json
-import tempfile
+import orjson
 import streamlit as st
 from datetime import datetime
-from PyPDF2 import PdfReader
+import fitz  # PyMuPDF
 from openai import OpenAI
 import logging
 import sys
@@ -49,23 +49,27 @@ class PayrollAgentSystem:
     def __init__(self):
         self.contract_data = {}
         self.salary_data = {}
+        self.total_deductions = None  # display-only; kept out of salary_data, which is sent to the LLM
         self.compliance_data = {}
         self.anomalies = {}
         
-    def extract_pdf_text(self, file_path):
-        """Extract text from PDF file"""
+    def extract_pdf_text(self, source):
+        """Extract text from a PDF path, or from PDF bytes / a binary file object (uploads)"""
         try:
-            reader = PdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() or ""
+            if isinstance(source, str):
+                doc = fitz.open(source)
+            else:
+                data = source if isinstance(source, (bytes, bytearray)) else source.read()
+                doc = fitz.open(stream=data, filetype="pdf")
+            with doc:
+                text = "".join(page.get_text() for page in doc)
             return text.strip()
         except Exception as e:
             logger.error(f"PDF extraction failed: {e}")
             return ""
     
-    def llm_call(self, prompt, content):
-        """Make LLM call with error handling"""
+    def llm_call(self, prompt, content, max_tokens=400):
+        """Make LLM call with error handling; max_tokens is sized to each agent's expected JSON reply"""
         try:
             response = client.chat.completions.create(
                 model="gemini-2.0-flash-exp",
@@ -74,7 +78,9 @@ class PayrollAgentSystem:
                     {"role": "user", "content": content}
                 ],
                 temperature=0.1,
-                max_tokens=2000
+                max_tokens=max_tokens,
+                # JSON mode: the reply is a bare object, no code fences or prose
+                response_format={"type": "json_object"}
             )
             return response.choices[0].message.content.strip()
         except Exception as e:
@@ -84,16 +90,7 @@ class PayrollAgentSystem:
     def safe_json_parse(self, text):
         """Safely parse JSON from LLM response"""
         try:
-            # Clean up common JSON formatting issues
-            text = text.strip()
-            if text.startswith("```json"):
-                text = text[7:]
-            if text.startswith("```"):
-                text = text[3:]
-            if text.endswith("```"):
-                text = text[:-3]
-            text = text.strip()
-            return json.loads(text)
+            return orjson.loads(text)
         except:
             logger.error(f"JSON parsing failed for: {text[:100]}...")
             return {}
@@ -111,16 +108,16 @@ class ContractReaderAgent(PayrollAgent):
     def __init__(self, agent_system):
         super().__init__("CONTRACT_READER_AGENT", agent_system)
     
-    def process(self, file_path):
+    def process(self, contract_pdf):
         self.log_agent_communication("Starting contract analysis...")
         
-        text = self.agent_system.extract_pdf_text(file_path)
+        text = self.agent_system.extract_pdf_text(contract_pdf)
         if not text:
             self.log_agent_communication("FAILED - Could not extract text from PDF")
             return {"success": False, "error": "Failed to extract PDF text"}
         
         prompt = """Extract employee salary details from this employment contract.
-        Return ONLY JSON with this structure:
+        Respond with a JSON object of this shape:
         {
           "employee_name": "string",
           "employee_id": "string or null", 
@@ -165,7 +162,7 @@ class SalaryCalculatorAgent(PayrollAgent):
         - Professional Tax: Rs.200/month (if salary > Rs.15,000)
         - TDS: Estimate based on annual salary
         
-        Return ONLY JSON:
+        Respond with a JSON object of this shape:
         {
           "gross_salary": number,
           "deductions": {
@@ -183,6 +180,8 @@ class SalaryCalculatorAgent(PayrollAgent):
         gross = self.agent_system.salary_data.get('gross_salary', 0)
         net = self.agent_system.salary_data.get('net_salary', 0)
         total_deductions = sum(self.agent_system.salary_data.get('deductions', {}).values())
+        # Keep the total for the UI so it isn't re-summed on every rerun
+        self.agent_system.total_deductions = total_deductions
         
         self.log_agent_communication(f"SUCCESS - Calculated salary breakdown")
         self.log_agent_communication(f"Gross: Rs.{gross:,.2f}, Net: Rs.{net:,.2f}, Deductions: Rs.{total_deductions:,.2f}")
@@ -204,7 +203,7 @@ class ComplianceCheckerAgent(PayrollAgent):
         prompt = """Validate salary calculations against Indian labor law compliance.
         Check PF limits, ESI eligibility, Professional tax rates.
         
-        Return ONLY JSON:
+        Respond with a JSON object of this shape:
         {
           "compliance_status": "COMPLIANT" or "NON_COMPLIANT",
           "issues": ["list of issues if any"],
@@ -240,7 +239,7 @@ class AnomalyDetectorAgent(PayrollAgent):
         prompt = """Detect payroll anomalies in the calculations.
         Check for calculation errors, unusual amounts, missing deductions.
         
-        Return ONLY JSON:
+        Respond with a JSON object of this shape:
         {
           "has_anomalies": boolean,
           "anomalies": [
@@ -259,7 +258,7 @@ class AnomalyDetectorAgent(PayrollAgent):
             "compliance": self.agent_system.compliance_data
         }
         
-        response = self.agent_system.llm_call(prompt, json.dumps(combined_data))
+        response = self.agent_system.llm_call(prompt, json.dumps(combined_data), max_tokens=600)
         self.agent_system.anomalies = self.agent_system.safe_json_parse(response)
         
         has_anomalies = self.agent_system.anomalies.get('has_anomalies', False)
@@ -285,13 +284,13 @@ class PayrollAgentOrchestrator:
         self.compliance_checker = ComplianceCheckerAgent(agent_system)
         self.anomaly_detector = AnomalyDetectorAgent(agent_system)
     
-    def process_contract(self, file_path):
-        """Orchestrate the entire payroll processing pipeline"""
+    def process_contract(self, contract_pdf):
+        """Orchestrate the entire payroll processing pipeline (contract_pdf: path, bytes or file object)"""
         logger.info("MAIN_COORDINATOR: Starting multi-agent payroll processing pipeline...")
         
         try:
             # Step 1: Contract Reader Agent
-            result1 = self.contract_reader.process(file_path)
+            result1 = self.contract_reader.process(contract_pdf)
             if not result1["success"]:
                 return {"success": False, "error": result1["error"]}
             
@@ -351,13 +350,8 @@ def main():
                 
                 with st.spinner("🤖 Agents are processing..."):
                     try:
-                        # Save uploaded file
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                            tmp.write(contract_file.read())
-                            contract_path = tmp.name
-                        
-                        # Process through agent orchestrator
-                        result = st.session_state.orchestrator.process_contract(contract_path)
+                        # Process the upload straight from memory (no temp file round-trip)
+                        result = st.session_state.orchestrator.process_contract(contract_file.getvalue())
                         
                         if result["success"]:
                             st.session_state.processing_complete = True
@@ -365,9 +359,6 @@ def main():
                         else:
                             st.error(f"❌ Processing failed: {result['error']}")
                         
-                        # Clean up temp file
-                        os.unlink(contract_path)
-                        
                     except Exception as e:
                         st.error(f"❌ Unexpected error: {str(e)}")
     
@@ -395,7 +386,9 @@ def main():
             
             gross = agent_system.salary_data.get('gross_salary', 0)
             net = agent_system.salary_data.get('net_salary', 0)
-            total_deductions = sum(agent_system.salary_data.get('deductions', {}).values())
+            total_deductions = agent_system.total_deductions
+            if total_deductions is None:
+                total_deductions = sum(agent_system.salary_data.get('deductions', {}).values())
             
             with col1:
                 st.metric("Gross Salary", f"₹{gross:,.2f}")
@@ -46,7 +46,7 @@ def demo_single_contract(api_key: str, contract_path: str):
                 salary = result.salary_data
                 print(f"   Gross Salary: ₹{salary.gross_salary:,.2f}")
                 print(f"   Net Salary: ₹{salary.net_salary:,.2f}")
-                print(f"   Total Deductions: ₹{sum(salary.deductions.dict().values()):,.2f}")
+                print(f"   Total Deductions: ₹{salary.deductions.total:,.2f}")
             
             if result.compliance_data:
                 print(f"   Compliance Status: {result.compliance_data.compliance_status}")
@@ -1,4 +1,5 @@
-from pydantic import BaseModel, Field
+from functools import cached_property
+from pydantic import BaseModel, ConfigDict, Field, computed_field, model_validator
 from typing import Optional, List, Dict, Any, Union
 from datetime import datetime
 from enum import Enum
@@ -30,6 +31,13 @@ class EmployeeInfo(BaseModel):
     pf_number: Optional[str] = None
     esi_number: Optional[str] = None
 
+# Salary fields normalized from annual to monthly amounts; variable pay and bonus stay annual
+MONTHLY_FIELDS = (
+    "basic", "hra", "allowances", "special_allowance", "medical_allowance",
+    "transport_allowance", "meal_allowance", "gross"
+)
+INV_12 = 1 / 12
+
 class SalaryStructure(BaseModel):
     basic: Optional[float] = None
     hra: Optional[float] = None
@@ -42,8 +50,24 @@ class SalaryStructure(BaseModel):
     variable_pay: Optional[float] = None
     bonus: Optional[float] = None
     is_annual: Optional[bool] = False
+    # Set when annual amounts were converted to monthly during validation
+    converted_from_annual: bool = False
+    
+    @model_validator(mode="after")
+    def _to_monthly(self) -> "SalaryStructure":
+        """Convert annual amounts to monthly as part of validation"""
+        if self.is_annual:
+            for field in MONTHLY_FIELDS:
+                value = getattr(self, field)
+                if value:
+                    setattr(self, field, value * INV_12)
+            self.is_annual = False
+            self.converted_from_annual = True
+        return self
 
 class Deductions(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     pf: float = 0.0
     esi: float = 0.0
     professional_tax: float = 0.0
@@ -51,6 +75,13 @@ class Deductions(BaseModel):
     advance: float = 0.0
     loan_deduction: float = 0.0
     other_deductions: float = 0.0
+    
+    @computed_field
+    @cached_property
+    def total(self) -> float:
+        """Sum of all deductions"""
+        return (self.pf + self.esi + self.professional_tax + self.tds +
+                self.advance + self.loan_deduction + self.other_deductions)
 
 class ContractData(BaseModel):
     employee_info: EmployeeInfo
@@ -83,6 +114,49 @@ class ComplianceRule(BaseModel):
     last_updated: datetime
     source_url: Optional[str] = None
 
+class PFRules(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
+    employee_rate: float
+    employer_rate: float
+    max_contribution: float
+    applicable: bool
+    calculation_base: str
+    rules: List[str] = []
+
+class ESIRules(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
+    employee_rate: float
+    employer_rate: float
+    salary_limit: float
+    applicable: bool
+    rules: List[str] = []
+
+class TaxRules(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
+    standard_deduction: float
+    section_80c_limit: float
+    applicable_slab: str
+    rules: List[str] = []
+
+class ProfessionalTaxRules(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
+    state: str
+    monthly_amount: float
+    applicable: bool
+    rules: List[str] = []
+
+class ApplicableRules(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
+    pf_rules: PFRules
+    esi_rules: ESIRules
+    tax_rules: TaxRules
+    professional_tax_rules: ProfessionalTaxRules
+
 class ComplianceValidation(BaseModel):
     compliance_status: ComplianceStatus
     issues: List[str] = []
@@ -113,6 +187,7 @@ class PaystubData(BaseModel):
     pay_period: str
     generated_date: datetime
     template_version: str = "v1.0"
+    pdf_path: Optional[str] = None
 
 class ProcessingResult(BaseModel):
     success: bool
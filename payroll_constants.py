@@ -0,0 +1,14 @@
+"""Statutory payroll rates and limits shared by the payroll agents"""
+
+# Provident Fund: employee share of basic salary, capped per month
+PF_RATE = 0.12
+PF_CAP = 1800.0
+
+# ESI: employee share of gross salary, only below the monthly salary limit
+ESI_RATE = 0.0075
+ESI_THRESHOLD = 21000
+
+# Income tax: (lower bound of taxable income, marginal rate) per slab, ascending
+TDS_SLABS = ((250_000, 0.05), (500_000, 0.20), (1_000_000, 0.30))
+STD_DEDUCTION = 50000
+CESS = 1.04
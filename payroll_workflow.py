@@ -1,5 +1,7 @@
 import os
+import asyncio
 import logging
+import queue
 import time
 from typing import Dict, Any, Optional, TypedDict, Annotated, List
 from datetime import datetime
@@ -14,7 +16,7 @@ from langchain_core.messages import BaseMessage
 from models import (
     WorkflowState, ProcessingResult, AgentResult, 
     ContractData, SalaryBreakdown, ComplianceValidation, 
-    AnomalyDetection, PaystubData
+    AnomalyDetection, PaystubData, ApplicableRules
 )
 from agents import (
     ContractReaderAgent, SalaryBreakdownAgent, ComplianceMapperAgent,
@@ -24,6 +26,11 @@ from rag_system import PayrollRAGSystem
 
 logger = logging.getLogger(__name__)
 
+# Agent progress events emitted by PayrollAgenticWorkflow.process_contract_async
+TASK_STARTED = "TASK_STARTED"
+TASK_COMPLETED = "TASK_COMPLETED"
+TASK_FAILED = "TASK_FAILED"
+
 class PayrollWorkflowState(TypedDict):
     """State for the payroll processing workflow"""
     contract_path: str
@@ -380,6 +387,77 @@ class PayrollAgenticWorkflow:
                 processing_time=(datetime.now() - initial_state["started_at"]).total_seconds()
             )
     
+    async def process_contract_async(self, contract_path: str, events: Optional[queue.Queue] = None) -> ProcessingResult:
+        """Process a contract, running independent agents concurrently
+
+        Contract reading, salary breakdown and compliance mapping depend on each
+        other and run in order; anomaly detection and paystub generation only need
+        their results and run together. Progress is reported on ``events`` as
+        ``(agent_key, TASK_STARTED | TASK_COMPLETED | TASK_FAILED)`` tuples.
+        """
+
+        # Create initial state
+        state = PayrollWorkflowState(
+            contract_path=contract_path,
+            employee_id=None,
+            current_step="start",
+            agent_results={},
+            final_result=None,
+            errors=[],
+            started_at=datetime.now(),
+            completed_at=None,
+            messages=[]
+        )
+
+        def run_node(agent_key: str, node) -> None:
+            if events is not None:
+                events.put((agent_key, TASK_STARTED))
+            node(state)
+            if events is not None:
+                agent_result = state["agent_results"].get(agent_key)
+                events.put((agent_key, TASK_COMPLETED if agent_result and agent_result.success else TASK_FAILED))
+
+        try:
+            logger.info(f"Starting concurrent payroll processing for contract: {contract_path}")
+
+            # Dependent steps run in order
+            await asyncio.to_thread(run_node, "contract_reader", self._contract_reader_node)
+            await asyncio.to_thread(run_node, "salary_breakdown", self._salary_breakdown_node)
+            await asyncio.to_thread(run_node, "compliance_mapper", self._compliance_mapper_node)
+
+            # Independent steps run together
+            await asyncio.gather(
+                asyncio.to_thread(run_node, "anomaly_detector", self._anomaly_detector_node),
+                asyncio.to_thread(run_node, "paystub_generator", self._paystub_generator_node)
+            )
+
+            self._finalize_result_node(state)
+
+            result = state.get("final_result")
+            if result:
+                logger.info(f"Payroll processing completed for employee: {result.employee_id}")
+                return result
+            else:
+                return ProcessingResult(
+                    success=False,
+                    employee_id="unknown",
+                    errors=state.get("errors", ["Unknown error occurred"]),
+                    processing_time=(datetime.now() - state["started_at"]).total_seconds()
+                )
+
+        except Exception as e:
+            logger.error(f"Workflow execution failed: {e}")
+            return ProcessingResult(
+                success=False,
+                employee_id="unknown",
+                errors=[f"Workflow execution failed: {str(e)}"],
+                processing_time=(datetime.now() - state["started_at"]).total_seconds()
+            )
+
+    def process_contract_concurrent(self, contract_path: str, events: Optional[queue.Queue] = None) -> ProcessingResult:
+        """Synchronous wrapper around process_contract_async"""
+        return asyncio.run(self.process_contract_async(contract_path, events))
+
     def process_contract_sync(self, contract_path: str, config: Optional[Dict[str, Any]] = None) -> ProcessingResult:
         """Synchronous version of contract processing"""
         
@@ -473,13 +551,13 @@ class PayrollAgenticWorkflow:
         except Exception as e:
             logger.error(f"Failed to update RAG rules: {e}")
     
-    def get_compliance_rules(self, employee_data: Dict[str, Any]) -> Dict[str, Any]:
+    def get_compliance_rules(self, employee_data: Dict[str, Any]) -> Optional[ApplicableRules]:
         """Get applicable compliance rules for an employee"""
         try:
             return self.rag_system.get_all_applicable_rules(employee_data)
         except Exception as e:
             logger.error(f"Failed to get compliance rules: {e}")
-            return {}
+            return None
 
 # Utility functions for workflow management
 def create_payroll_workflow(api_key: str, persist_directory: str = "./chroma_db") -> PayrollAgenticWorkflow:
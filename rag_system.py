@@ -8,7 +8,10 @@ from chromadb.config import Settings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.document_loaders import WebBaseLoader, PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from models import RAGDocument, ComplianceRule
+from models import (
+    RAGDocument, ComplianceRule, ApplicableRules, PFRules, ESIRules,
+    TaxRules, ProfessionalTaxRules
+)
 
 logger = logging.getLogger(__name__)
 
@@ -238,24 +241,24 @@ class PayrollRAGSystem:
             logger.error(f"Error searching compliance rules: {e}")
             return []
     
-    def get_pf_rules(self, basic_salary: float) -> Dict[str, Any]:
+    def get_pf_rules(self, basic_salary: float) -> PFRules:
         """Get specific PF rules for a given basic salary"""
         query = f"PF provident fund contribution rules basic salary {basic_salary}"
         results = self.search_compliance_rules(query, "pf_rule", top_k=3)
         
         # Extract structured PF information
-        pf_info = {
-            "employee_rate": 0.12,
-            "employer_rate": 0.12,
-            "max_contribution": 1800,
-            "applicable": True,
-            "calculation_base": "basic_salary",
-            "rules": [r["content"] for r in results]
-        }
+        pf_info = PFRules(
+            employee_rate=0.12,
+            employer_rate=0.12,
+            max_contribution=1800,
+            applicable=True,
+            calculation_base="basic_salary",
+            rules=[r["content"] for r in results]
+        )
         
         return pf_info
     
-    def get_esi_rules(self, gross_salary: float) -> Dict[str, Any]:
+    def get_esi_rules(self, gross_salary: float) -> ESIRules:
         """Get specific ESI rules for a given gross salary"""
         query = f"ESI employee state insurance contribution rules gross salary {gross_salary}"
         results = self.search_compliance_rules(query, "esi_rule", top_k=3)
@@ -263,32 +266,32 @@ class PayrollRAGSystem:
         # Determine ESI applicability
         applicable = gross_salary <= 21000
         
-        esi_info = {
-            "employee_rate": 0.0075 if applicable else 0,
-            "employer_rate": 0.0325 if applicable else 0,
-            "salary_limit": 21000,
-            "applicable": applicable,
-            "rules": [r["content"] for r in results]
-        }
+        esi_info = ESIRules(
+            employee_rate=0.0075 if applicable else 0,
+            employer_rate=0.0325 if applicable else 0,
+            salary_limit=21000,
+            applicable=applicable,
+            rules=[r["content"] for r in results]
+        )
         
         return esi_info
     
-    def get_tax_rules(self, annual_income: float) -> Dict[str, Any]:
+    def get_tax_rules(self, annual_income: float) -> TaxRules:
         """Get specific tax rules for a given annual income"""
         query = f"income tax TDS rules annual income {annual_income} tax slabs"
         results = self.search_compliance_rules(query, "tax_rule", top_k=3)
         
         # Calculate applicable tax slab
-        tax_info = {
-            "standard_deduction": 50000,
-            "section_80c_limit": 150000,
-            "applicable_slab": self._get_tax_slab(annual_income),
-            "rules": [r["content"] for r in results]
-        }
+        tax_info = TaxRules(
+            standard_deduction=50000,
+            section_80c_limit=150000,
+            applicable_slab=self._get_tax_slab(annual_income),
+            rules=[r["content"] for r in results]
+        )
         
         return tax_info
     
-    def get_professional_tax_rules(self, state: str, gross_salary: float) -> Dict[str, Any]:
+    def get_professional_tax_rules(self, state: str, gross_salary: float) -> ProfessionalTaxRules:
         """Get professional tax rules for a specific state and salary"""
         query = f"professional tax rules {state} salary {gross_salary}"
         results = self.search_compliance_rules(query, "state_rule", top_k=3)
@@ -296,12 +299,12 @@ class PayrollRAGSystem:
         # State-specific professional tax calculation
         pt_amount = self._calculate_professional_tax(state, gross_salary)
         
-        pt_info = {
-            "state": state,
-            "monthly_amount": pt_amount,
-            "applicable": pt_amount > 0,
-            "rules": [r["content"] for r in results]
-        }
+        pt_info = ProfessionalTaxRules(
+            state=state,
+            monthly_amount=pt_amount,
+            applicable=pt_amount > 0,
+            rules=[r["content"] for r in results]
+        )
         
         return pt_info
     
@@ -377,7 +380,7 @@ class PayrollRAGSystem:
         except Exception as e:
             logger.error(f"Error updating rules from URL {url}: {e}")
     
-    def get_all_applicable_rules(self, employee_data: Dict[str, Any]) -> Dict[str, Any]:
+    def get_all_applicable_rules(self, employee_data: Dict[str, Any]) -> ApplicableRules:
         """Get all applicable compliance rules for an employee"""
         try:
             basic_salary = employee_data.get("basic_salary", 0)
@@ -385,15 +388,15 @@ class PayrollRAGSystem:
             annual_income = gross_salary * 12
             state = employee_data.get("state", "Karnataka")
             
-            rules = {
-                "pf_rules": self.get_pf_rules(basic_salary),
-                "esi_rules": self.get_esi_rules(gross_salary),
-                "tax_rules": self.get_tax_rules(annual_income),
-                "professional_tax_rules": self.get_professional_tax_rules(state, gross_salary)
-            }
+            rules = ApplicableRules(
+                pf_rules=self.get_pf_rules(basic_salary),
+                esi_rules=self.get_esi_rules(gross_salary),
+                tax_rules=self.get_tax_rules(annual_income),
+                professional_tax_rules=self.get_professional_tax_rules(state, gross_salary)
+            )
             
             return rules
             
         except Exception as e:
             logger.error(f"Error getting applicable rules: {e}")
-            return {}
\ No newline at end of file
+            raise
\ No newline at end of file
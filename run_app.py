@@ -32,7 +32,7 @@ def check_dependencies():
     required_packages = [
         'streamlit', 'langchain', 'langgraph', 'chromadb', 
         'langchain-google-genai', 'pydantic', 'plotly', 
-        'pandas', 'PyPDF2', 'reportlab'
+        'pandas', 'pymupdf', 'reportlab'
     ]
     
     missing_packages = []